@@ -65,7 +65,13 @@ os_opts = [
                help='A domain name the os_admin_username belongs to.'),
     cfg.StrOpt('os_admin_project_domain_name',
                default='Default',
-               help='A domain name the os_admin_project_name belongs to')
+               help='A domain name the os_admin_project_name belongs to'),
+    cfg.IntOpt('os_http_pool_maxsize',
+               default=32,
+               min=1,
+               help='Maximum number of HTTP connections kept open per '
+                    'OpenStack service endpoint. Connections are shared by '
+                    'all clients Blazar creates.')
 ]
 
 api_opts = [
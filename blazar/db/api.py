@@ -312,6 +312,11 @@ def host_allocation_get_all_by_values(**kwargs):
     return IMPL.host_allocation_get_all_by_values(**kwargs)
 
 
+def host_allocation_count_by_host_ids(host_ids):
+    """Returns a dict of {host id: number of allocations}."""
+    return IMPL.host_allocation_count_by_host_ids(host_ids)
+
+
 # TODO(frossigneux) get methods
 
 
@@ -338,18 +343,35 @@ def host_get(host_id):
     return IMPL.host_get(host_id)
 
 
+def host_get_with_allocation_flag(host_id):
+    """Return a Compute host and whether it has allocations."""
+    host, has_allocation = IMPL.host_get_with_allocation_flag(host_id)
+    return (host.to_dict() if host else None), has_allocation
+
+
 @to_dict
 def host_list():
     """Return a list of events."""
     return IMPL.host_list()
 
 
+@to_dict
+def host_get_all_by_ids(host_ids):
+    """Return the Compute hosts with the given ids."""
+    return IMPL.host_get_all_by_ids(host_ids)
+
+
 @to_dict
 def host_get_all_by_filters(filters):
     """Returns Compute hosts filtered by name of the field."""
     return IMPL.host_get_all_by_filters(filters)
 
 
+def host_get_all_for_polling():
+    """Returns the fields of all Compute hosts needed by health polling."""
+    return IMPL.host_get_all_for_polling()
+
+
 @to_dict
 def host_get_all_by_queries(queries):
     """Returns hosts filtered by an array of queries."""
@@ -378,6 +400,11 @@ def host_update(host_id, values):
     IMPL.host_update(host_id, values)
 
 
+def host_update_bulk(host_ids, values):
+    """Update several Compute hosts with the same values at once."""
+    IMPL.host_update_bulk(host_ids, values)
+
+
 # ComputeHostExtraCapabilities
 
 def host_extra_capability_create(values):
@@ -385,6 +412,11 @@ def host_extra_capability_create(values):
     return IMPL.host_extra_capability_create(values)
 
 
+def host_extra_capability_create_bulk(values_list):
+    """Create several Host ExtraCapabilities in a single transaction."""
+    IMPL.host_extra_capability_create_bulk(values_list)
+
+
 def host_extra_capability_get(host_extra_capability_id):
     """Return a specific Host Extracapability."""
     return IMPL.host_extra_capability_get(host_extra_capability_id)
@@ -395,6 +427,11 @@ def host_extra_capability_get_all_per_host(host_id):
     return IMPL.host_extra_capability_get_all_per_host(host_id)
 
 
+def host_extra_capability_get_all():
+    """Return all host extra_capabilities ordered by Compute host."""
+    return IMPL.host_extra_capability_get_all()
+
+
 def host_extra_capability_destroy(host_extra_capability_id):
     """Delete specific host ExtraCapability."""
     IMPL.host_extra_capability_destroy(host_extra_capability_id)
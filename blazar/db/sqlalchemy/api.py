@@ -595,6 +595,22 @@ def host_allocation_get_all_by_values(**kwargs):
     return allocation_query.all()
 
 
+def host_allocation_count_by_host_ids(host_ids):
+    """Returns the number of allocations of each host.
+
+    Hosts without any allocation are not part of the result.
+    """
+    if not host_ids:
+        return {}
+    query = (get_session().query(
+        models.ComputeHostAllocation.compute_host_id,
+        sa.func.count(models.ComputeHostAllocation.id))
+        .filter(models.ComputeHostAllocation.deleted.is_(None))
+        .filter(models.ComputeHostAllocation.compute_host_id.in_(host_ids))
+        .group_by(models.ComputeHostAllocation.compute_host_id))
+    return dict(query.all())
+
+
 def host_allocation_create(values):
     values = values.copy()
     host_allocation = models.ComputeHostAllocation()
@@ -653,10 +669,31 @@ def host_get(host_id):
     return _host_get(get_session(), host_id)
 
 
+def host_get_with_allocation_flag(host_id):
+    """Return a host and whether it has allocations, in a single query."""
+    has_allocation = sa.exists().where(sa.and_(
+        models.ComputeHostAllocation.compute_host_id == models.ComputeHost.id,
+        models.ComputeHostAllocation.deleted.is_(None)))
+    query = get_session().query(models.ComputeHost, has_allocation)
+    query = _read_deleted_filter(query, models.ComputeHost, False)
+    result = query.filter(models.ComputeHost.id == host_id).first()
+    if result is None:
+        return None, False
+    host, host_has_allocation = result
+    return host, bool(host_has_allocation)
+
+
 def host_list():
     return model_query(models.ComputeHost, get_session()).all()
 
 
+def host_get_all_by_ids(host_ids):
+    if not host_ids:
+        return []
+    return _host_get_all(get_session()).filter(
+        models.ComputeHost.id.in_(host_ids)).all()
+
+
 def host_get_all_by_filters(filters):
     """Returns hosts filtered by name of the field."""
 
@@ -669,12 +706,24 @@ def host_get_all_by_filters(filters):
     return hosts_query.all()
 
 
+def host_get_all_for_polling():
+    """Return the id, name, type and reservable flag of all hosts."""
+    query = get_session().query(models.ComputeHost.id,
+                                models.ComputeHost.hypervisor_hostname,
+                                models.ComputeHost.hypervisor_type,
+                                models.ComputeHost.reservable)
+    query = _read_deleted_filter(query, models.ComputeHost, False)
+    return [row._asdict() for row in query.all()]
+
+
 def host_get_all_by_queries(queries):
     """Returns hosts filtered by an array of queries.
 
     :param queries: array of queries "key op value" where op can be
         http://docs.sqlalchemy.org/en/rel_0_7/core/expression_api.html
             #sqlalchemy.sql.operators.ColumnOperators
+        A query can also be a (key, op, value) tuple, whose value is used
+        as is: it is not split on commas for 'in' nor mapped from 'null'.
 
     """
     hosts_query = model_query(models.ComputeHost, get_session())
@@ -690,15 +739,16 @@ def host_get_all_by_queries(queries):
 
     hosts = []
     for query in queries:
+        parsed = isinstance(query, tuple)
         try:
-            key, op, value = query.split(' ', 2)
+            key, op, value = query if parsed else query.split(' ', 2)
         except ValueError:
             raise db_exc.BlazarDBInvalidFilter(query_filter=query)
 
         column = getattr(models.ComputeHost, key, None)
         if column is not None:
             if op == 'in':
-                filt = column.in_(value.split(','))
+                filt = column.in_(value if parsed else value.split(','))
             else:
                 if op in oper:
                     op = oper[op][0]
@@ -709,7 +759,7 @@ def host_get_all_by_queries(queries):
                     raise db_exc.BlazarDBInvalidFilterOperator(
                         filter_operator=op)
 
-                if value == 'null':
+                if value == 'null' and not parsed:
                     value = None
 
                 filt = getattr(column, attr)(value)
@@ -796,6 +846,15 @@ def host_update(host_id, values):
     return host_get(host_id)
 
 
+def host_update_bulk(host_ids, values):
+    session = get_session()
+
+    with session.begin():
+        query = model_query(models.ComputeHost, session)
+        query.filter(models.ComputeHost.id.in_(host_ids)).update(
+            values, synchronize_session=False)
+
+
 def host_destroy(host_id):
     session = get_session()
     with session.begin():
@@ -844,6 +903,11 @@ def host_extra_capability_get_all_per_host(host_id):
                                                    host_id).all()
 
 
+def host_extra_capability_get_all():
+    return _host_extra_capability_query(get_session()).order_by(
+        models.ComputeHostExtraCapability.computehost_id).all()
+
+
 def host_extra_capability_create(values):
     values = values.copy()
 
@@ -870,6 +934,32 @@ def host_extra_capability_create(values):
     return host_extra_capability_get(host_extra_capability.id)
 
 
+def host_extra_capability_create_bulk(values_list):
+    host_extra_capabilities = []
+    for values in values_list:
+        values = values.copy()
+
+        resource_property = resource_property_get_or_create(
+            'physical:host', values.pop('capability_name'))
+        values['capability_id'] = resource_property.id
+
+        host_extra_capability = models.ComputeHostExtraCapability()
+        host_extra_capability.update(values)
+        host_extra_capabilities.append(host_extra_capability)
+
+    session = get_session()
+
+    with session.begin():
+        try:
+            session.add_all(host_extra_capabilities)
+            session.flush()
+        except common_db_exc.DBDuplicateEntry as e:
+            # raise exception about duplicated columns (e.columns)
+            raise db_exc.BlazarDBDuplicateEntry(
+                model=models.ComputeHostExtraCapability.__name__,
+                columns=e.columns)
+
+
 def host_extra_capability_update(host_extra_capability_id, values):
     session = get_session()
 
@@ -320,6 +320,37 @@ def get_free_periods(resource_id, start_date, end_date, duration,
                                             end_date,
                                             duration,
                                             resource_type=resource_type)
+    return _get_free_periods(reserved_periods, start_date, end_date,
+                             duration)
+
+
+def get_reserved_host_ids(host_ids, start_date, end_date):
+    """Returns the set of host ids reserved at some point of the period.
+
+    A host is reserved if one of its leases overlaps the period by more than
+    an instant, which matches the hosts get_free_periods() would not return
+    the whole period for.
+    """
+    if not host_ids:
+        return set()
+    session = get_session()
+    query = (session.query(models.ComputeHostAllocation.compute_host_id)
+             .join(models.Reservation,
+                   models.Reservation.id ==
+                   models.ComputeHostAllocation.reservation_id)
+             .join(models.Lease)
+             .filter(models.ComputeHostAllocation.deleted.is_(None))
+             .filter(models.ComputeHostAllocation.compute_host_id
+                     .in_(host_ids))
+             .filter(models.Lease.start_date < end_date)
+             .filter(models.Lease.end_date > start_date)
+             .filter(models.Lease.start_date < models.Lease.end_date)
+             .distinct())
+    return {host_id for host_id, in query}
+
+
+def _get_free_periods(reserved_periods, start_date, end_date, duration):
+    """Compute the free periods around a list of reserved periods."""
     free_periods = []
     previous = (start_date, start_date)
     if len(reserved_periods) >= 1:
@@ -338,7 +369,6 @@ def get_free_periods(resource_id, start_date, end_date, duration,
 
 def _get_events(resource_id, start_date, end_date, resource_type):
     """Create a list of events."""
-    events = {}
     if resource_type == 'host':
         leases = _get_leases_from_host_id(resource_id, start_date, end_date)
     elif resource_type == 'floatingip':
@@ -350,6 +380,12 @@ def _get_events(resource_id, start_date, end_date, resource_type):
     else:
         mgr_exceptions.UnsupportedResourceType(resource_type)
 
+    return _get_events_from_leases(leases, start_date, end_date)
+
+
+def _get_events_from_leases(leases, start_date, end_date):
+    """Create a list of events from leases."""
+    events = {}
     for lease in leases:
         if lease.start_date < start_date:
             min_date = start_date
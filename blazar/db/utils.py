@@ -163,6 +163,11 @@ def get_free_periods(resource_id, start_date, end_date, duration,
                                  resource_type=resource_type)
 
 
+def get_reserved_host_ids(host_ids, start_date, end_date):
+    """Returns the set of host ids reserved at some point of the period."""
+    return IMPL.get_reserved_host_ids(host_ids, start_date, end_date)
+
+
 def get_reserved_periods(resource_id, start_date, end_date, duration,
                          resource_type='host'):
     """Returns a list of reserved periods."""
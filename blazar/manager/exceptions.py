@@ -262,6 +262,10 @@ class RouterNotFound(exceptions.NotFound):
     msg_fmt = _("Router '%(router)s' not found!")
 
 
+class ShareAccessDenyFailed(exceptions.BlazarException):
+    msg_fmt = _("Failed to deny access rules %(rules)s of share %(share)s")
+
+
 class InvalidNetwork(exceptions.NotAuthorized):
     msg_fmt = _("Invalid values for network %(network)s")
 
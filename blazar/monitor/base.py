@@ -41,16 +41,19 @@ class BaseMonitor(object):
             healing_interval_mins = plugin.get_healing_interval()
             if healing_interval_mins > 0:
                 self.healing_timers.append(
-                    self.tg.add_timer(healing_interval_mins * 60,
-                                      self.call_monitor_plugin,
-                                      None,
-                                      plugin.heal))
+                    self.tg.add_dynamic_timer(self.call_healing_plugin,
+                                              None, None, plugin))
 
     def stop_periodic_healing(self):
         """Stop periodic healing process."""
         for timer in self.healing_timers:
             self.tg.timer_done(timer)
 
+    def call_healing_plugin(self, plugin):
+        """Heal reservations and return seconds until the next healing."""
+        self.call_monitor_plugin(plugin.heal_periodically)
+        return plugin.get_next_healing_interval() * 60
+
     def call_monitor_plugin(self, callback, *args, **kwargs):
         """Call a callback and update lease/reservation flags."""
         # This method has to handle any exception internally. It shouldn't
@@ -24,6 +24,7 @@ import blazar.manager.service
 import blazar.notification.notifier
 import blazar.plugins.oshosts.host_plugin
 import blazar.utils.openstack.keystone
+import blazar.utils.openstack.neutron
 import blazar.utils.openstack.nova
 
 
@@ -48,6 +49,7 @@ def list_opts():
             blazar.enforcement.filters.max_lease_duration_filter.MaxLeaseDurationFilter.enforcement_opts, # noqa
             blazar.enforcement.enforcement.enforcement_opts)),
         ('notifications', blazar.notification.notifier.notification_opts),
+        ('neutron', blazar.utils.openstack.neutron.neutron_opts),
         ('nova', blazar.utils.openstack.nova.nova_opts),
         (blazar.plugins.oshosts.RESOURCE_TYPE,
          blazar.plugins.oshosts.host_plugin.plugin_opts),
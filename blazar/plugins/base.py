@@ -15,6 +15,7 @@
 
 import abc
 import collections
+import functools
 
 from blazar.db import api as db_api
 from blazar.db import utils as db_utils
@@ -26,6 +27,12 @@ LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
 
 
+@functools.lru_cache(maxsize=1024)
+def _authorized_projects(authorized_projects):
+    """Return the cached set of projects of an authorized_projects CSV."""
+    return frozenset(authorized_projects.split(","))
+
+
 class BasePlugin(object, metaclass=abc.ABCMeta):
 
     resource_type = 'none'
@@ -164,9 +171,9 @@ class BasePlugin(object, metaclass=abc.ABCMeta):
         # If this resource has the extra capability "authorized_projects"
         if "authorized_projects" in resource and \
                 isinstance(resource["authorized_projects"], str):
-            # Parse the field as a CSV, and check the resulting list
-            authorized_projects = resource["authorized_projects"].split(",")
-            return project_id in authorized_projects
+            # Parse the field as a CSV, and check the resulting set
+            return project_id in _authorized_projects(
+                resource["authorized_projects"])
         return True
 
     def add_extra_allocation_info(self, resource_allocations):
@@ -251,9 +258,21 @@ class BaseMonitorPlugin(metaclass=abc.ABCMeta):
         """Get interval of reservation healing in minutes."""
         pass
 
+    def get_next_healing_interval(self):
+        """Get interval until the next reservation healing in minutes."""
+        return self.get_healing_interval()
+
     @abc.abstractmethod
     def heal(self):
         """Heal suffering reservations.
 
         :return: a dictionary of {reservation id: flags to update}
         """
+        pass
+
+    def heal_periodically(self):
+        """Heal suffering reservations from the healing timer.
+
+        :return: a dictionary of {reservation id: flags to update}
+        """
+        return self.heal()
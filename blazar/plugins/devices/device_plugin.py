@@ -383,16 +383,24 @@ class DevicePlugin(base.BasePlugin):
 
         return self.get_allocations(device_id, data)
 
-    def _reallocate(self, allocation):
+    def _reallocate(self, allocation, now=None, reservation=None,
+                    lease=None):
         """Allocate an alternative device.
 
         :param allocation: allocation to change.
+        :param now: current time, to share one value across a healing sweep.
+        :param reservation: reservation of the allocation, if already known.
+        :param lease: lease of the reservation, if already known.
         :return: True if an alternative device was successfully allocated.
         """
-        reservation = db_api.reservation_get(allocation['reservation_id'])
+        if now is None:
+            now = datetime.datetime.utcnow()
+        if reservation is None:
+            reservation = db_api.reservation_get(allocation['reservation_id'])
         device_reservation = db_api.device_reservation_get(
             reservation['resource_id'])
-        lease = db_api.lease_get(reservation['lease_id'])
+        if lease is None:
+            lease = db_api.lease_get(reservation['lease_id'])
 
         # Remove the old device from the trait.
         if reservation['status'] == status.reservation.ACTIVE:
@@ -401,7 +409,7 @@ class DevicePlugin(base.BasePlugin):
                 device, device_reservation, lease)
 
         # Allocate an alternative device.
-        start_date = max(datetime.datetime.utcnow(), lease['start_date'])
+        start_date = max(now, lease['start_date'])
         new_deviceids = self._matching_devices(
             device_reservation['resource_properties'],
             '1-1', start_date, lease['end_date'], lease['project_id']
@@ -113,8 +113,7 @@ class FloatingIpPlugin(base.BasePlugin):
                         lease['project_id'], reservation_id)
                     created_fips.append(fip['floating_ip_address'])
                 except Exception as e:
-                    for fip_address in created_fips:
-                        fip_pool.delete_reserved_floatingip(fip_address)
+                    fip_pool.delete_reserved_floatingips(created_fips)
                     err_msg = 'Failed to create floating IP: {}'.format(str(e))
                     raise manager_ex.NeutronClientError(err_msg)
 
@@ -266,9 +265,10 @@ class FloatingIpPlugin(base.BasePlugin):
         reservation = db_api.reservation_get(fip_reservation["reservation_id"])
         if reservation["status"] == status.reservation.ACTIVE:
             fip_pool = neutron.FloatingIPPool(fip_reservation['network_id'])
-            for alloc in allocations:
-                fip = db_api.floatingip_get(alloc['floatingip_id'])
-                fip_pool.delete_reserved_floatingip(fip['floating_ip_address'])
+            fips = [db_api.floatingip_get(alloc['floatingip_id'])
+                    for alloc in allocations]
+            fip_pool.delete_reserved_floatingips(
+                [fip['floating_ip_address'] for fip in fips])
         for alloc in allocations:
             db_api.fip_allocation_destroy(alloc['id'])
 
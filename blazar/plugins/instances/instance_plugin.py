@@ -673,6 +673,8 @@ class VirtualInstancePlugin(base.BasePlugin, nova.NovaClientWrapper):
         reservation_flags = collections.defaultdict(dict)
 
         host_ids = [h['id'] for h in failed_resources]
+        if not host_ids:
+            return {}
         reservations = db_utils.get_reservations_by_host_ids(
             host_ids, interval_begin, interval_end)
 
@@ -15,10 +15,12 @@
 # under the License.
 
 import datetime
+import threading
 
 from oslo_config import cfg
 
 import abc
+from blazar.db import api as db_api
 from blazar.manager import exceptions as manager_ex
 from blazar.plugins import base
 from blazar import status
@@ -50,6 +52,19 @@ monitor_opts = [
                help='Interval (minutes) of reservation healing. '
                     'If 0 is specified, the interval is infinite and all the '
                     'reservations in the future is healed at one time.'),
+    cfg.IntOpt('healing_max_interval',
+               default=60,
+               min=0,
+               help='Maximum interval (minutes) of reservation healing. '
+                    'While healing flags no reservation, the interval is '
+                    'multiplied by healing_backoff_factor up to this value. '
+                    'It is reset to healing_interval as soon as a '
+                    'reservation is flagged.'),
+    cfg.FloatOpt('healing_backoff_factor',
+                 default=2.0,
+                 min=1.0,
+                 help='Factor applied to the healing interval after a '
+                      'healing that flags no reservation.'),
 ]
 
 CONF = cfg.CONF
@@ -61,13 +76,20 @@ class GeneralMonitorPlugin(base.BaseMonitorPlugin, metaclass=abc.ABCMeta):
 
     # Singleton design pattern
     _instance = None
+    _instance_lock = threading.Lock()
+    # Interval (minutes) until the next healing, None until the first one
+    _next_healing_interval = None
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
-            cls._instance = \
-                super(GeneralMonitorPlugin, cls).__new__(cls)
-            cls._instance.resource_type = kwargs.get("resource_type")
-            super(GeneralMonitorPlugin, cls._instance).__init__()
+            with cls._instance_lock:
+                # Another thread may have created the instance while this
+                # one was waiting for the lock
+                if not cls._instance:
+                    instance = super(GeneralMonitorPlugin, cls).__new__(cls)
+                    instance.resource_type = kwargs.get("resource_type")
+                    super(GeneralMonitorPlugin, instance).__init__()
+                    cls._instance = instance
         return cls._instance
 
     def __init__(self, *args, **kwargs):
@@ -127,6 +149,14 @@ class GeneralMonitorPlugin(base.BaseMonitorPlugin, metaclass=abc.ABCMeta):
         """
         pass
 
+    def set_reservable_bulk(self, resources, is_reservable):
+        """Set several resources as reservable or not reservable
+
+        Plugins can override this to update all the resources at once.
+        """
+        for resource in resources:
+            self.set_reservable(resource, is_reservable)
+
     def heal_reservations(self, failed_resources, interval_begin,
                           interval_end):
         """Heal reservations which suffer from resource failures.
@@ -139,8 +169,11 @@ class GeneralMonitorPlugin(base.BaseMonitorPlugin, metaclass=abc.ABCMeta):
                        {'missing_resources': True}}
         """
         reservation_flags = {}
+        now = datetime.datetime.utcnow()
 
         resource_ids = [h['id'] for h in failed_resources]
+        if not resource_ids:
+            return reservation_flags
         reservations = self.get_reservations_by_resource_ids(resource_ids,
                                                              interval_begin,
                                                              interval_end)
@@ -151,11 +184,26 @@ class GeneralMonitorPlugin(base.BaseMonitorPlugin, metaclass=abc.ABCMeta):
                 continue
 
             reservation_id = reservation["id"]
+            allocations = self.filter_allocations(reservation, resource_ids)
+            if not allocations:
+                continue
 
-            for allocation in self.filter_allocations(reservation,
-                                                      resource_ids):
+            # Look up the reservation and its lease once for all of its
+            # allocations to heal
+            try:
+                reservation_values = db_api.reservation_get(reservation_id)
+                lease = db_api.lease_get(reservation['lease_id'])
+            except Exception:
+                LOG.exception("Cannot heal reservation %s, failed to look "
+                              "up the reservation or its lease",
+                              reservation_id)
+                continue
+
+            for allocation in allocations:
                 try:
-                    if not self._reallocate(allocation):
+                    if not self._reallocate(allocation, now=now,
+                                            reservation=reservation_values,
+                                            lease=lease):
                         if reservation_id not in reservation_flags:
                             reservation_flags[reservation_id] = {}
                         reservation_flags[reservation_id].update(
@@ -195,11 +243,9 @@ class GeneralMonitorPlugin(base.BaseMonitorPlugin, metaclass=abc.ABCMeta):
 
         failed_resources, recovered_resources = self.poll_resource_failures()
         if failed_resources:
-            for resource in failed_resources:
-                self.set_reservable(resource, False)
+            self.set_reservable_bulk(failed_resources, False)
         if recovered_resources:
-            for resource in recovered_resources:
-                self.set_reservable(resource, True)
+            self.set_reservable_bulk(recovered_resources, True)
 
         return self.heal()
 
@@ -207,24 +253,64 @@ class GeneralMonitorPlugin(base.BaseMonitorPlugin, metaclass=abc.ABCMeta):
         """Get interval of reservation healing in minutes."""
         return CONF[self.resource_type].healing_interval
 
-    def heal(self):
+    def get_next_healing_interval(self):
+        """Get interval until the next reservation healing in minutes.
+
+        The interval backs off exponentially while healing flags no
+        reservation and is reset to the healing interval otherwise.
+        """
+        if self._next_healing_interval is None:
+            return self.get_healing_interval()
+        return self._next_healing_interval
+
+    def _backoff_healing_interval(self, interval):
+        conf = CONF[self.resource_type]
+        max_interval = max(conf.healing_max_interval, conf.healing_interval)
+        return min(interval * conf.healing_backoff_factor, max_interval)
+
+    def heal(self, interval=None):
         """Heal suffering reservations in the next healing interval.
 
+        :param interval: minutes ahead to heal reservations in, the healing
+                         interval by default.
         :return: a dictionary of {reservation id: flags to update}
         """
         reservation_flags = {}
         resources = self.get_unreservable_resourses()
 
-        interval_begin = datetime.datetime.utcnow()
+        if resources:
+            if interval is None:
+                interval = self.get_healing_interval()
+            interval_begin = datetime.datetime.utcnow()
+            if interval == 0:
+                interval_end = datetime.date.max
+            else:
+                interval_end = interval_begin + datetime.timedelta(
+                    minutes=interval)
+            reservation_flags.update(self.heal_reservations(resources,
+                                                            interval_begin,
+                                                            interval_end))
+
+        return reservation_flags
+
+    def heal_periodically(self):
+        """Heal suffering reservations from the healing timer.
+
+        While healing flags no reservation, the interval until the next
+        healing backs off, otherwise it is reset to the healing interval.
+
+        :return: a dictionary of {reservation id: flags to update}
+        """
         interval = self.get_healing_interval()
-        if interval == 0:
-            interval_end = datetime.date.max
-        else:
-            interval_end = interval_begin + datetime.timedelta(
-                minutes=interval)
+        backoff_interval = self._backoff_healing_interval(
+            self.get_next_healing_interval())
 
-        reservation_flags.update(self.heal_reservations(resources,
-                                                        interval_begin,
-                                                        interval_end))
+        # Cover the longest wait until the next healing
+        reservation_flags = self.heal(interval=backoff_interval)
+
+        if reservation_flags:
+            self._next_healing_interval = interval
+        else:
+            self._next_healing_interval = backoff_interval
 
         return reservation_flags
@@ -15,6 +15,7 @@
 # under the License.
 
 import datetime
+import functools
 import json
 from random import shuffle
 
@@ -64,6 +65,17 @@ before_end_options = ['', 'snapshot', 'default', 'email']
 QUERY_TYPE_ALLOCATION = 'allocation'
 
 
+@functools.lru_cache(maxsize=256)
+def _convert_requirements(requirements):
+    """Return the cached conversion of a requirements string.
+
+    Properties strings come from a small set of reservation templates, so
+    matchmaking keeps parsing the same ones. A tuple is cached so callers
+    cannot mutate the shared result.
+    """
+    return tuple(plugins_utils.convert_requirements(requirements))
+
+
 def _get_plugins():
     """Return dict of resource-plugin class pairs."""
     plugins = {}
@@ -866,12 +878,14 @@ class NetworkPlugin(base.BasePlugin):
 
     def _filter_networks_by_properties(self, network_properties,
                                        resource_properties):
-        filter = []
-        if network_properties:
-            filter += plugins_utils.convert_requirements(network_properties)
-        if resource_properties:
-            filter += plugins_utils.convert_requirements(resource_properties)
+        # Concatenating the cached tuples allocates nothing when both
+        # properties are empty, which is the case for unrestricted requests
+        filter = (
+            (_convert_requirements(network_properties)
+             if network_properties else ()) +
+            (_convert_requirements(resource_properties)
+             if resource_properties else ()))
         if filter:
-            return db_api.network_get_all_by_queries(filter)
+            return db_api.network_get_all_by_queries(list(filter))
         else:
             return db_api.network_list()
@@ -16,7 +16,7 @@
 from blazar.manager import exceptions as manager_ex
 from blazar.utils.openstack import manila
 from blazar.utils.openstack import neutron
-import collections
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_service import periodic_task
@@ -36,6 +36,10 @@ opts = [
     cfg.StrOpt('storage_router',
                default='filesystem-ganesha-router',
                help='The storage router name'),
+    cfg.IntOpt('access_rules_concurrency',
+               default=8,
+               help='Maximum number of concurrent manila requests issued '
+                    'when setting share access rules.'),
 ]
 
 CONF = cfg.CONF
@@ -118,68 +122,132 @@ class StoragePlugin():
         ports = self.neutron_client.list_ports(
             device_id=self.ganesha_router["id"]
         )["ports"]
-        result = collections.defaultdict(list)
-        for p in ports:
-            for fixed_ip in p["fixed_ips"]:
-                subnet = self.neutron_client.show_subnet(
-                    fixed_ip["subnet_id"]
-                )["subnet"]
-                result[subnet["tenant_id"]].append(subnet["cidr"])
+        subnet_ids = [
+            fixed_ip["subnet_id"] for p in ports for fixed_ip in p["fixed_ips"]
+        ]
+        if not subnet_ids:
+            return {}
+        # fetch every subnet in one request instead of one per fixed IP
+        subnets = {
+            subnet["id"]: subnet for subnet in
+            self.neutron_client.list_subnets(
+                id=sorted(set(subnet_ids)))["subnets"]
+        }
+        missing_subnet_ids = set(subnet_ids).difference(subnets)
+        if missing_subnet_ids:
+            LOG.warning(
+                f"Subnets {', '.join(sorted(missing_subnet_ids))} attached "
+                f"to router {self.ganesha_router['id']} were not found"
+            )
+        result = {}
+        for subnet_id in subnet_ids:
+            subnet = subnets.get(subnet_id)
+            if subnet:
+                result.setdefault(subnet["tenant_id"], []).append(
+                    subnet["cidr"])
 
         return result
 
+    def _bulk_deny(self, manila_client, share_id, rule_ids):
+        """Deny all the given access rules of a share.
+
+        The Manila API only accepts one access rule per deny request, so the
+        requests are issued concurrently rather than one after the other.
+        Every request is attempted before the failures are raised together.
+        """
+        if not rule_ids:
+            return
+        if len(rule_ids) == 1:
+            manila_client.shares.deny(share_id, rule_ids[0])
+            return
+        failed_rule_ids = []
+
+        def _deny(rule_id):
+            try:
+                manila_client.shares.deny(share_id, rule_id)
+            except Exception:
+                LOG.exception(f"Failed to deny access rule {rule_id} "
+                              f"for share {share_id}")
+                failed_rule_ids.append(rule_id)
+
+        pool = eventlet.GreenPool(
+            CONF.network_storage.access_rules_concurrency)
+        for rule_id in rule_ids:
+            pool.spawn_n(_deny, rule_id)
+        pool.waitall()
+        if failed_rule_ids:
+            raise manager_ex.ShareAccessDenyFailed(
+                share=share_id, rules=", ".join(failed_rule_ids))
+
     @periodic_task.periodic_task(
         spacing=CONF.network_storage.set_manila_share_access_rules_interval,
         run_immediately=True
     )
     def _set_manila_share_access_rules(self, manager_obj, context):
         manila_client = manila.BlazarManilaClient()
-        # get all available shares
-        shares = manila_client.shares.list(
+        # get all available shares while neutron is queried for the router
+        # interfaces
+        shares_thread = eventlet.spawn(
+            manila_client.shares.list,
             search_opts={
                 "all_tenants": 1,
                 "share_type": CONF.network_storage.ceph_nfs_share_type,
                 "status": "available",
             }
         )
+        try:
+            ganesha_router_project_cidrs = (
+                self._get_ganesha_router_interfaces())
+        finally:
+            shares = shares_thread.wait()
 
-        ganesha_router_project_cidrs = self._get_ganesha_router_interfaces()
+        def _access_list(share):
+            try:
+                return share, manila_client.shares.access_list(share.id)
+            except Exception as e:
+                return share, e
 
-        for share in shares:
+        pool = eventlet.GreenPool(
+            CONF.network_storage.access_rules_concurrency)
+        for share, access_rules in pool.imap(_access_list, shares):
             try:
+                if isinstance(access_rules, Exception):
+                    raise access_rules
                 proj = share.project_id
-                access_rules = manila_client.shares.access_list(share.id)
                 existing_ip_to_rule_id = {
                     rule.access_to: rule.id for rule in access_rules
                     if rule.access_level == "rw"
                 }
-                existing_ips = list(existing_ip_to_rule_id.keys())
-                new_ips = ganesha_router_project_cidrs.get(proj, [])
-                ips_to_add = set(new_ips).difference(existing_ips)
-                ips_to_delete = set(existing_ips).difference(new_ips)
-                for ip in ips_to_add:
-                    manila_client.shares.allow(
-                        share.id, "ip", ip, "rw"
-                    )
-                for ip in ips_to_delete:
-                    manila_client.shares.deny(
-                        share.id, existing_ip_to_rule_id[ip]
-                    )
                 # all users should have ro access to a public share
                 existing_ro_rule_ids = [
                     rule.id for rule in access_rules
                     if rule.access_level == "ro"
                 ]
+                new_ips = set(ganesha_router_project_cidrs.get(proj, []))
+                # nothing has drifted since the last run, skip this share
+                if (existing_ip_to_rule_id.keys() == new_ips and
+                        bool(share.is_public) == bool(existing_ro_rule_ids)):
+                    continue
+                ips_to_add = new_ips.difference(existing_ip_to_rule_id)
+                ips_to_delete = set(existing_ip_to_rule_id).difference(
+                    new_ips)
+                for ip in ips_to_add:
+                    manila_client.shares.allow(
+                        share.id, "ip", ip, "rw"
+                    )
+                self._bulk_deny(
+                    manila_client, share.id,
+                    [existing_ip_to_rule_id[ip] for ip in ips_to_delete]
+                )
                 if share.is_public and not existing_ro_rule_ids:
                     for prefix in self.ganesha_subnetpool["prefixes"]:
                         manila_client.shares.allow(
                             share.id, "ip", prefix, "ro"
                         )
                 if not share.is_public and existing_ro_rule_ids:
-                    for rule_id in existing_ro_rule_ids:
-                        manila_client.shares.deny(
-                            share.id, rule_id
-                        )
+                    self._bulk_deny(
+                        manila_client, share.id, existing_ro_rule_ids
+                    )
             except Exception as e:
                 LOG.exception(
                     f"Failed to manage access rules for share {share.id}"
@@ -14,8 +14,13 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import contextlib
 import datetime
+import functools
+import itertools
+import threading
 
+import eventlet
 from novaclient import exceptions as nova_exceptions
 from oslo_config import cfg
 from oslo_utils import strutils
@@ -59,6 +64,18 @@ plugin_opts = [
                 default=True,
                 help='Whether an allocation should be retried on failure '
                      'without the default properties'),
+    cfg.IntOpt('server_action_concurrency',
+               default=16,
+               help='Maximum number of concurrent Nova requests issued when '
+                    'snapshotting or deleting the servers of a reservation '
+                    'at the end of a lease.'),
+    cfg.FloatOpt('notification_batch_delay',
+                 default=0.1,
+                 min=0,
+                 help='Delay (seconds) during which host state notifications '
+                      'are collected before being handled together. If 0 is '
+                      'specified, each notification is handled as soon as '
+                      'it is received.'),
 ]
 
 plugin_opts.extend(monitor.monitor_opts)
@@ -76,6 +93,32 @@ QUERY_TYPE_ALLOCATION = 'allocation'
 MONITOR_ARGS = {"resource_type": plugin.RESOURCE_TYPE}
 
 
+def _parse_count_range(count_range):
+    """Return the (min, max) host counts of a 'min-max' count range."""
+    min_host, max_host = count_range.split('-')
+    return int(min_host), int(max_host)
+
+
+@functools.lru_cache(maxsize=4096)
+def _convert_requirements(requirements):
+    """Return the cached conversion of a requirements string.
+
+    Reservations keep their properties strings unchanged, so allocation
+    updates and healing convert the same ones over and over. A tuple is
+    cached so callers cannot mutate the shared result.
+    """
+    return tuple(plugins_utils.convert_requirements(requirements))
+
+
+@functools.lru_cache(maxsize=1024)
+def _requirement_keys(requirements):
+    """Return the cached set of keys constrained by a requirements string."""
+    # A requirement is of the form "key op value" as string
+    return frozenset(
+        requirement.split(" ")[0]
+        for requirement in _convert_requirements(requirements))
+
+
 class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
     """Plugin for physical host resource."""
     resource_type = plugin.RESOURCE_TYPE
@@ -86,6 +129,7 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
     query_options = {
         QUERY_TYPE_ALLOCATION: ['lease_id', 'reservation_id']
     }
+    _host_queries = threading.local()
 
     def __init__(self):
         super(PhysicalHostPlugin, self).__init__()
@@ -148,12 +192,11 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
 
         updates = {}
         if 'min' in values or 'max' in values:
-            count_range = str(values.get(
-                'min', host_reservation['count_range'].split('-')[0])
-            ) + '-' + str(values.get(
-                'max', host_reservation['count_range'].split('-')[1])
-            )
-            updates['count_range'] = count_range
+            min_host, max_host = _parse_count_range(
+                host_reservation['count_range'])
+            updates['count_range'] = (
+                str(values.get('min', min_host)) + '-' +
+                str(values.get('max', max_host)))
         if 'hypervisor_properties' in values:
             updates['hypervisor_properties'] = values.get(
                 'hypervisor_properties')
@@ -167,11 +210,12 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
         """Add the hosts in the pool."""
         host_reservation = db_api.host_reservation_get(resource_id)
         pool = nova.ReservationPool()
-        hosts = []
-        for allocation in db_api.host_allocation_get_all_by_values(
-                reservation_id=host_reservation['reservation_id']):
-            host = db_api.host_get(allocation['compute_host_id'])
-            hosts.append(host['hypervisor_hostname'])
+        host_ids = [
+            allocation['compute_host_id'] for allocation in
+            db_api.host_allocation_get_all_by_values(
+                reservation_id=host_reservation['reservation_id'])]
+        hosts = [host['hypervisor_hostname']
+                 for host in db_api.host_get_all_by_ids(host_ids)]
         pool.add_computehost(host_reservation['aggregate_id'], hosts)
 
         action = host_reservation.get('on_start', 'default')
@@ -197,16 +241,21 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
         if action == 'snapshot':
             pool = nova.ReservationPool()
             client = nova.BlazarNovaClient()
-            for host in pool.get_computehosts(
-                    host_reservation['aggregate_id']):
+            servers = [
+                server
+                for host in pool.get_computehosts(
+                    host_reservation['aggregate_id'])
                 for server in client.servers.list(
                     search_opts={"node": host, "all_tenants": 1,
-                                 "project_id": lease['project_id']}):
-                    # TODO(jason): Unclear if this even works! What happens
-                    # when you try to createImage on a server not owned by the
-                    # authentication context (admin context in this case.) Is
-                    # the snapshot owned by the admin, or the original
-                    client.servers.create_image(server=server)
+                                 "project_id": lease['project_id']})
+            ]
+            # TODO(jason): Unclear if this even works! What happens
+            # when you try to createImage on a server not owned by the
+            # authentication context (admin context in this case.) Is
+            # the snapshot owned by the admin, or the original
+            self._run_server_actions(
+                lambda server: client.servers.create_image(server=server),
+                servers)
         elif action == 'email':
             plugins_utils.send_lease_extension_reminder(
                 lease, CONF.os_region_name)
@@ -221,35 +270,59 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
         for allocation in allocations:
             db_api.host_allocation_destroy(allocation['id'])
         pool = nova.ReservationPool()
-        for host in pool.get_computehosts(host_reservation['aggregate_id']):
-            for server in self.nova.servers.list(
-                    search_opts={"node": host, "all_tenants": 1}):
-                try:
-                    self.nova.servers.delete(server=server)
-                except nova_exceptions.NotFound:
-                    LOG.info('Could not find server %s, may have been deleted '
-                             'concurrently.', server)
-                except Exception as e:
-                    LOG.exception('Failed to delete %s: %s.', server, str(e))
+        client = self.nova
+        servers = [
+            server
+            for host in pool.get_computehosts(host_reservation['aggregate_id'])
+            for server in client.servers.list(
+                detailed=False, search_opts={"node": host, "all_tenants": 1})
+        ]
+
+        def _delete_server(server):
+            try:
+                client.servers.delete(server=server)
+            except nova_exceptions.NotFound:
+                LOG.info('Could not find server %s, may have been deleted '
+                         'concurrently.', server)
+            except Exception as e:
+                LOG.exception('Failed to delete %s: %s.', server, str(e))
+
+        self._run_server_actions(_delete_server, servers)
         try:
             pool.delete(host_reservation['aggregate_id'])
         except manager_ex.AggregateNotFound:
             pass
 
-    def _reallocate(self, allocation):
+    def _run_server_actions(self, action, servers):
+        """Call action on every server, a bounded number at a time."""
+        green_pool = eventlet.GreenPool(
+            CONF[plugin.RESOURCE_TYPE].server_action_concurrency)
+        # Consume the results so that a failed action is raised here
+        for _ in green_pool.imap(action, servers):
+            pass
+
+    def _reallocate(self, allocation, now=None, reservation=None,
+                    lease=None):
         """Allocate an alternative host.
 
         :param allocation: allocation to change.
+        :param now: current time, to share one value across a healing sweep.
+        :param reservation: reservation of the allocation, if already known.
+        :param lease: lease of the reservation, if already known.
         :return: True if an alternative host was successfully allocated.
         """
-        reservation = db_api.reservation_get(allocation['reservation_id'])
-        h_reservation = db_api.host_reservation_get(
-            reservation['resource_id'])
-        lease = db_api.lease_get(reservation['lease_id'])
+        if now is None:
+            now = datetime.datetime.utcnow()
+        if reservation is None:
+            reservation = db_api.reservation_get(allocation['reservation_id'])
+        if lease is None:
+            lease = db_api.lease_get(reservation['lease_id'])
         pool = nova.ReservationPool()
 
         # Remove the old host from the aggregate.
         if reservation['status'] == status.reservation.ACTIVE:
+            h_reservation = db_api.host_reservation_get(
+                reservation['resource_id'])
             host = db_api.host_get(allocation['compute_host_id'])
 
             servers = self.nova.servers.list(search_opts={
@@ -264,11 +337,11 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
                                     host['hypervisor_hostname'])
 
         # Allocate an alternative host.
-        start_date = max(datetime.datetime.utcnow(), lease['start_date'])
+        start_date = max(now, lease['start_date'])
         new_hostids = self._matching_hosts(
             reservation['hypervisor_properties'],
             reservation['resource_properties'],
-            '1-1', start_date, lease['end_date'],
+            (1, 1), start_date, lease['end_date'],
             lease['project_id'],
         )
         if not new_hostids:
@@ -303,8 +376,10 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
         return self.get_computehost(host_id)
 
     def get_computehost(self, host_id):
-        host = db_api.host_get(host_id)
-        extra_capabilities = self._get_extra_capabilities(host_id)
+        return self._merge_extra_capabilities(
+            db_api.host_get(host_id), self._get_extra_capabilities(host_id))
+
+    def _merge_extra_capabilities(self, host, extra_capabilities):
         if host is not None and extra_capabilities:
             res = host.copy()
             res.update(extra_capabilities)
@@ -314,9 +389,22 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
 
     def list_computehosts(self, query=None):
         raw_host_list = db_api.host_list()
+        caps_by_host = {
+            host_id: {
+                capability_name: capability.capability_value
+                for capability, capability_name in capabilities
+            }
+            for host_id, capabilities in itertools.groupby(
+                db_api.host_extra_capability_get_all(),
+                key=lambda row: row[0].computehost_id)
+        }
         host_list = []
         for host in raw_host_list:
-            host_list.append(self.get_computehost(host['id']))
+            extra_capabilities = caps_by_host.get(host['id'])
+            if extra_capabilities:
+                host = host.copy()
+                host.update(extra_capabilities)
+            host_list.append(host)
         return host_list
 
     def create_computehost(self, host_values):
@@ -345,13 +433,12 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
             del host_details['id']
         # NOTE(sbauza): Only last duplicate name for same extra capability
         # will be stored
-        to_store = set(host_values.keys()) - set(host_details.keys())
-        extra_capabilities_keys = to_store
+        extra_capabilities_keys = host_values.keys() - host_details.keys()
         extra_capabilities = dict(
             (key, host_values[key]) for key in extra_capabilities_keys
         )
 
-        if any([len(key) > 64 for key in extra_capabilities_keys]):
+        if any(len(key) > 64 for key in extra_capabilities_keys):
             raise manager_ex.ExtraCapabilityTooLong()
 
         self.placement_client.create_reservation_provider(
@@ -380,40 +467,46 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
             self.placement_client.delete_reservation_provider(
                 host_details['hypervisor_hostname'])
             raise e
-        for key in extra_capabilities:
-            values = {'computehost_id': host['id'],
-                      'capability_name': key,
-                      'capability_value': extra_capabilities[key],
-                      }
+        capabilities_values = [
+            {'computehost_id': host['id'],
+             'capability_name': key,
+             'capability_value': value}
+            for key, value in extra_capabilities.items()]
+        if capabilities_values:
             try:
-                db_api.host_extra_capability_create(values)
+                db_api.host_extra_capability_create_bulk(capabilities_values)
             except db_ex.BlazarDBException:
-                cantaddextracapability.append(key)
+                # Nothing was stored, retry one by one to find out which
+                # capabilities can't be added
+                for values in capabilities_values:
+                    try:
+                        db_api.host_extra_capability_create(values)
+                    except db_ex.BlazarDBException:
+                        cantaddextracapability.append(
+                            values['capability_name'])
         if cantaddextracapability:
             raise manager_ex.CantAddExtraCapability(
                 keys=cantaddextracapability,
                 host=host['id'])
         return self.get_computehost(host['id'])
 
-    def is_updatable_extra_capability(self, capability, capability_name):
+    def is_updatable_extra_capability(self, capability, capability_name,
+                                      now=None):
+        if now is None:
+            now = datetime.datetime.utcnow()
         reservations = db_utils.get_reservations_by_host_id(
-            capability['computehost_id'], datetime.datetime.utcnow(),
-            datetime.date.max)
+            capability['computehost_id'], now, datetime.date.max)
 
         for r in reservations:
             plugin_reservation = db_utils.get_plugin_reservation(
                 r['resource_type'], r['resource_id'])
 
-            requirements_queries = plugins_utils.convert_requirements(
-                plugin_reservation['resource_properties'])
-
             # TODO(masahito): If all the reservations using the
             # extra_capability can be re-allocated it's okay to update
             # the extra_capability.
-            for requirement in requirements_queries:
-                # A requirement is of the form "key op value" as string
-                if requirement.split(" ")[0] == capability_name:
-                    return False
+            if capability_name in _requirement_keys(
+                    plugin_reservation['resource_properties']):
+                return False
         return True
 
     def update_computehost(self, host_id, values):
@@ -424,14 +517,24 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
         cant_update_extra_capability = []
         cant_delete_extra_capability = []
         previous_capabilities = self._get_extra_capabilities(host_id)
-        updated_keys = set(values.keys()) & set(previous_capabilities.keys())
+        # Setting a capability to its current value is not an update
+        updated_keys = {
+            key for key in set(values.keys()) & set(previous_capabilities)
+            if values[key] != previous_capabilities[key]
+        }
         new_keys = set(values.keys()) - set(previous_capabilities.keys())
 
+        if not updated_keys and not new_keys:
+            return self._merge_extra_capabilities(
+                db_api.host_get(host_id), previous_capabilities)
+
+        now = datetime.datetime.utcnow()
         for key in updated_keys:
             raw_capability, cap_name = next(iter(
                 db_api.host_extra_capability_get_all_per_name(host_id, key)))
 
-            if self.is_updatable_extra_capability(raw_capability, cap_name):
+            if self.is_updatable_extra_capability(raw_capability, cap_name,
+                                                  now=now):
                 if values[key] is not None:
                     try:
                         capability = {'capability_value': values[key]}
@@ -475,12 +578,11 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
         return self.get_computehost(host_id)
 
     def delete_computehost(self, host_id):
-        host = db_api.host_get(host_id)
+        host, has_allocation = db_api.host_get_with_allocation_flag(host_id)
         if not host:
             raise manager_ex.HostNotFound(host=host_id)
 
-        if db_api.host_allocation_get_all_by_values(
-                compute_host_id=host_id):
+        if has_allocation:
             raise manager_ex.CantDeleteHost(
                 host=host_id,
                 msg='The host is reserved.'
@@ -618,19 +720,18 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
 
     def allocation_candidates(self, values):
         self._check_params(values)
+        count_range = _parse_count_range(values['count_range'])
 
         host_ids = self._matching_hosts(
             values['hypervisor_properties'],
             values['resource_properties'],
-            values['count_range'],
+            count_range,
             values['start_date'],
             values['end_date'],
             values['project_id'],
         )
 
-        min_hosts, _ = [int(n) for n in values['count_range'].split('-')]
-
-        if len(host_ids) < min_hosts:
+        if len(host_ids) < count_range[0]:
             raise manager_ex.NotEnoughHostsAvailable()
 
         return host_ids
@@ -639,13 +740,10 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
                         count_range, start_date, end_date, project_id):
         """Return the matching hosts (preferably not allocated)
 
+        :param count_range: (min, max) tuple of the number of hosts.
         """
-        count_range = count_range.split('-')
-        min_host = count_range[0]
-        max_host = count_range[1]
-        allocated_host_ids = []
-        not_allocated_host_ids = []
-        filter_array = []
+        min_host, max_host = count_range
+        filter_array = ()
         start_date_with_margin = start_date - datetime.timedelta(
             minutes=CONF.cleaning_time)
         end_date_with_margin = end_date + datetime.timedelta(
@@ -653,33 +751,40 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
 
         # TODO(frossigneux) support "or" operator
         if hypervisor_properties:
-            filter_array = plugins_utils.convert_requirements(
-                hypervisor_properties)
+            filter_array = _convert_requirements(hypervisor_properties)
         if resource_properties:
-            filter_array += plugins_utils.convert_requirements(
-                resource_properties)
-        for host in db_api.reservable_host_get_all_by_queries(filter_array):
-            if not self.is_project_allowed(project_id, resource_properties):
-                continue
-            if not db_api.host_allocation_get_all_by_values(
-                    compute_host_id=host['id']):
-                not_allocated_host_ids.append(host['id'])
-            elif db_utils.get_free_periods(
-                host['id'],
-                start_date_with_margin,
-                end_date_with_margin,
-                end_date_with_margin - start_date_with_margin
-            ) == [
-                (start_date_with_margin, end_date_with_margin),
-            ]:
-                allocated_host_ids.append(host['id'])
-        if len(not_allocated_host_ids) >= int(min_host):
+            filter_array += _convert_requirements(resource_properties)
+        if not self.is_project_allowed(project_id, resource_properties):
+            return []
+        host_ids = [host['id'] for host in
+                    self._hosts_matching(filter_array, reservable=True)]
+        allocation_counts = db_api.host_allocation_count_by_host_ids(
+            host_ids)
+        not_allocated_host_ids = [
+            host_id for host_id in host_ids
+            if not allocation_counts.get(host_id)
+        ]
+        if len(not_allocated_host_ids) >= min_host:
             shuffle(not_allocated_host_ids)
-            return not_allocated_host_ids[:int(max_host)]
+            return not_allocated_host_ids[:max_host]
+        # Allocated hosts are only needed when there are not enough hosts
+        # without any allocation, and only those free for the whole period.
+        allocated_host_ids = [
+            host_id for host_id in host_ids if allocation_counts.get(host_id)
+        ]
+        if allocated_host_ids:
+            reserved_host_ids = db_utils.get_reserved_host_ids(
+                allocated_host_ids,
+                start_date_with_margin,
+                end_date_with_margin)
+            allocated_host_ids = [
+                host_id for host_id in allocated_host_ids
+                if host_id not in reserved_host_ids
+            ]
         all_host_ids = allocated_host_ids + not_allocated_host_ids
-        if len(all_host_ids) >= int(min_host):
+        if len(all_host_ids) >= min_host:
             shuffle(all_host_ids)
-            return all_host_ids[:int(max_host)]
+            return all_host_ids[:max_host]
         else:
             return []
 
@@ -733,14 +838,22 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
         if max_hosts < min_hosts:
             raise manager_ex.InvalidRange()
         values['count_range'] = str(min_hosts) + '-' + str(max_hosts)
+        return min_hosts, max_hosts
 
     def _update_allocations(self, dates_before, dates_after, reservation_id,
                             reservation_status, host_reservation, values):
-        min_hosts = values.get('min', int(
-            host_reservation['count_range'].split('-')[0]))
-        max_hosts = values.get(
-            'max', int(host_reservation['count_range'].split('-')[1]))
-        self._validate_min_max_range(values, min_hosts, max_hosts)
+        with self._cached_host_queries():
+            self._do_update_allocations(
+                dates_before, dates_after, reservation_id,
+                reservation_status, host_reservation, values)
+
+    def _do_update_allocations(self, dates_before, dates_after,
+                               reservation_id, reservation_status,
+                               host_reservation, values):
+        min_hosts, max_hosts = _parse_count_range(
+            host_reservation['count_range'])
+        min_hosts, max_hosts = self._validate_min_max_range(
+            values, values.get('min', min_hosts), values.get('max', max_hosts))
         hypervisor_properties = values.get(
             'hypervisor_properties',
             host_reservation['hypervisor_properties'])
@@ -765,7 +878,7 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
             max_hosts = max_hosts - kept_hosts
             host_ids = self._matching_hosts(
                 hypervisor_properties, resource_properties,
-                str(min_hosts) + '-' + str(max_hosts),
+                (min_hosts, max_hosts),
                 dates_after['start_date'], dates_after['end_date'],
                 values['project_id']
             )
@@ -792,13 +905,15 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
                                hypervisor_properties, resource_properties,
                                allocs):
         allocs_to_remove = []
-        requested_host_ids = [host['id'] for host in
+        ids_to_remove = set()
+        requested_host_ids = {host['id'] for host in
                               self._filter_hosts_by_properties(
-                                  hypervisor_properties, resource_properties)]
+                                  hypervisor_properties, resource_properties)}
 
         for alloc in allocs:
             if alloc['compute_host_id'] not in requested_host_ids:
                 allocs_to_remove.append(alloc)
+                ids_to_remove.add(alloc['id'])
                 continue
             if (dates_before['start_date'] > dates_after['start_date'] or
                     dates_before['end_date'] < dates_after['end_date']):
@@ -818,12 +933,13 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
                          reserved_periods[0][0] == max_start and
                          reserved_periods[0][1] == min_end)):
                     allocs_to_remove.append(alloc)
+                    ids_to_remove.add(alloc['id'])
 
         kept_hosts = len(allocs) - len(allocs_to_remove)
         if kept_hosts > max_hosts:
             allocs_to_remove.extend(
                 [allocation for allocation in allocs
-                 if allocation not in allocs_to_remove
+                 if allocation['id'] not in ids_to_remove
                  ][:(kept_hosts - max_hosts)]
             )
 
@@ -831,21 +947,56 @@ class PhysicalHostPlugin(base.BasePlugin, nova.NovaClientWrapper):
 
     def _filter_hosts_by_properties(self, hypervisor_properties,
                                     resource_properties):
-        filter = []
+        filter = ()
         if hypervisor_properties:
-            filter += plugins_utils.convert_requirements(hypervisor_properties)
+            filter += _convert_requirements(hypervisor_properties)
         if resource_properties:
-            filter += plugins_utils.convert_requirements(resource_properties)
-        if filter:
-            return db_api.host_get_all_by_queries(filter)
-        else:
+            filter += _convert_requirements(resource_properties)
+        return self._hosts_matching(filter)
+
+    @contextlib.contextmanager
+    def _cached_host_queries(self):
+        """Share host query results within the enclosed block.
+
+        The cache is local to the calling thread and dropped on exit, so
+        results never outlive the request that computed them.
+        """
+        self._host_queries.cache = {}
+        try:
+            yield
+        finally:
+            del self._host_queries.cache
+
+    def _hosts_matching(self, queries, reservable=False):
+        """Return the hosts matching queries, optionally only reservable ones.
+
+        Inside _cached_host_queries, the hosts matching the same queries are
+        only fetched once and the reservable ones are filtered from them.
+        """
+        cache = getattr(self._host_queries, 'cache', None)
+        if cache is None:
+            if reservable:
+                return db_api.reservable_host_get_all_by_queries(
+                    list(queries))
+            if queries:
+                return db_api.host_get_all_by_queries(list(queries))
             return db_api.host_list()
+        key = tuple(queries)
+        if key not in cache:
+            cache[key] = (db_api.host_get_all_by_queries(list(queries))
+                          if queries else db_api.host_list())
+        if reservable:
+            return [host for host in cache[key] if host['reservable']]
+        return cache[key]
 
 
 class PhysicalHostMonitorPlugin(monitor.GeneralMonitorPlugin,
                                 nova.NovaClientWrapper):
     """Monitor plugin for physical host resource."""
 
+    # {hypervisor hostname: failed} of the notifications not handled yet
+    _pending_host_states = None
+
     def __new__(cls, *args, **kwargs):
         return super(PhysicalHostMonitorPlugin, cls).__new__(cls, *args,
                                                              **kwargs)
@@ -884,37 +1035,63 @@ class PhysicalHostMonitorPlugin(monitor.GeneralMonitorPlugin,
 
         data = payload.get('nova_object.data', None)
         if data:
-            if data['disabled'] or data['forced_down']:
+            # Notifications often come in bursts, e.g. when a rack goes
+            # down, so host states are collected and handled together.
+            # Only the last state received for a host is kept.
+            delay = CONF[plugin.RESOURCE_TYPE].notification_batch_delay
+            pending = self._pending_host_states
+            if pending is None:
+                pending = self._pending_host_states = {}
+                if delay:
+                    eventlet.spawn_after(delay, self._handle_host_states)
+            pending[data['host']] = data['disabled'] or data['forced_down']
+            if not delay:
+                self._handle_host_states()
+
+        return reservation_flags
+
+    def _handle_host_states(self):
+        """Update the hosts of the pending notifications at once."""
+        host_states = self._pending_host_states or {}
+        self._pending_host_states = None
+
+        failed = [host for host, failed in host_states.items() if failed]
+        recovered = [host for host, failed in host_states.items()
+                     if not failed]
+        try:
+            if failed:
                 failed_hosts = db_api.reservable_host_get_all_by_queries(
-                    ['hypervisor_hostname == ' + data['host']])
+                    [('hypervisor_hostname', 'in', failed)])
                 if failed_hosts:
-                    LOG.warn('%s failed.',
-                             failed_hosts[0]['hypervisor_hostname'])
-                    for host in failed_hosts:
-                        self.set_reservable(host, False)
-            else:
+                    self.set_reservable_bulk(failed_hosts, False)
+            if recovered:
                 recovered_hosts = db_api.host_get_all_by_queries(
                     ['reservable == 0',
-                     'hypervisor_hostname == ' + data['host']])
+                     ('hypervisor_hostname', 'in', recovered)])
                 if recovered_hosts:
-                    db_api.host_update(recovered_hosts[0]['id'],
-                                       {'reservable': True})
-                    LOG.warn('%s recovered.',
-                             recovered_hosts[0]['hypervisor_hostname'])
-
-        return reservation_flags
+                    self.set_reservable_bulk(recovered_hosts, True)
+        except Exception:
+            LOG.exception('Failed to handle host state notifications.')
 
     def set_reservable(self, resource, is_reservable):
         db_api.host_update(resource["id"], {"reservable": is_reservable})
         LOG.warn('%s %s.', resource["hypervisor_hostname"],
                  "recovered" if is_reservable else "failed")
 
+    def set_reservable_bulk(self, resources, is_reservable):
+        db_api.host_update_bulk([resource["id"] for resource in resources],
+                                {"reservable": is_reservable})
+        for resource in resources:
+            LOG.warn('%s %s.', resource["hypervisor_hostname"],
+                     "recovered" if is_reservable else "failed")
+
     def poll_resource_failures(self):
         """Check health of hosts by calling Nova Hypervisors API.
 
         :return: a list of failed hosts, a list of recovered hosts.
         """
-        hosts = db_api.host_get_all_by_filters({})
+        # Only the fields used below and by set_reservable() are loaded
+        hosts = db_api.host_get_all_for_polling()
 
         ironic_hosts = []
         nova_hosts = []
@@ -928,52 +1105,58 @@ class PhysicalHostMonitorPlugin(monitor.GeneralMonitorPlugin,
         recovered_hosts = []
         try:
             if ironic_hosts:
-                invalid_power_states = ['error']
-                invalid_provision_states = ['error', 'clean failed',
-                                            'manageable', 'deploy failed']
-                reservable_hosts = [h for h in ironic_hosts
-                                    if h['reservable'] is True]
-                unreservable_hosts = [h for h in ironic_hosts
-                                      if h['reservable'] is False]
+                invalid_power_states = {'error'}
+                invalid_provision_states = {'error', 'clean failed',
+                                            'manageable', 'deploy failed'}
 
                 ironic_client = ironic.BlazarIronicClient()
-                nodes = ironic_client.ironic.node.list()
-                failed_bm_ids = [n.uuid for n in nodes
-                                 if n.maintenance
-                                 or n.power_state in invalid_power_states
-                                 or n.provision_state
-                                 in invalid_provision_states]
-                failed_hosts.extend([host for host in reservable_hosts
-                                     if host['hypervisor_hostname']
-                                     in failed_bm_ids])
-                active_bm_ids = [n.uuid for n in nodes
-                                 if not n.maintenance
-                                 and n.provision_state in ['available']]
-                recovered_hosts.extend([host for host in unreservable_hosts
-                                        if host['hypervisor_hostname']
-                                        in active_bm_ids])
+                failed_bm_ids = set()
+                active_bm_ids = set()
+                for node in ironic_client.ironic.node.list():
+                    maintenance = node.maintenance
+                    provision_state = node.provision_state
+                    if (maintenance
+                            or node.power_state in invalid_power_states
+                            or provision_state in invalid_provision_states):
+                        failed_bm_ids.add(node.uuid)
+                    if not maintenance and provision_state == 'available':
+                        active_bm_ids.add(node.uuid)
+                self._partition_hosts(
+                    ironic_hosts, 'hypervisor_hostname', failed_bm_ids,
+                    active_bm_ids, failed_hosts, recovered_hosts)
 
             if nova_hosts:
-                reservable_hosts = [h for h in nova_hosts
-                                    if h['reservable'] is True]
-                unreservable_hosts = [h for h in nova_hosts
-                                      if h['reservable'] is False]
-
-                hvs = self.nova.hypervisors.list()
-
-                failed_hv_ids = [str(hv.id) for hv in hvs
-                                 if hv.state == 'down'
-                                 or hv.status == 'disabled']
-                failed_hosts.extend([host for host in reservable_hosts
-                                     if host['id'] in failed_hv_ids])
-
-                active_hv_ids = [str(hv.id) for hv in hvs
-                                 if hv.state == 'up'
-                                 and hv.status == 'enabled']
-                recovered_hosts.extend([host for host in unreservable_hosts
-                                        if host['id'] in active_hv_ids])
+                failed_hv_ids = set()
+                active_hv_ids = set()
+                # Only the id, state and status of hypervisors are used
+                for hv in self.nova.hypervisors.list(detailed=False):
+                    state, hv_status = hv.state, hv.status
+                    if state == 'down' or hv_status == 'disabled':
+                        failed_hv_ids.add(str(hv.id))
+                    elif state == 'up' and hv_status == 'enabled':
+                        active_hv_ids.add(str(hv.id))
+                self._partition_hosts(
+                    nova_hosts, 'id', failed_hv_ids, active_hv_ids,
+                    failed_hosts, recovered_hosts)
 
         except Exception as e:
             LOG.exception('Skipping health check. %s', str(e))
 
         return failed_hosts, recovered_hosts
+
+    @staticmethod
+    def _partition_hosts(hosts, key, failed_ids, active_ids,
+                         failed_hosts, recovered_hosts):
+        """Sort hosts into failed and recovered ones in a single pass.
+
+        Reservable hosts whose key is in failed_ids are added to
+        failed_hosts, unreservable hosts whose key is in active_ids are
+        added to recovered_hosts.
+        """
+        for host in hosts:
+            if host['reservable'] is True:
+                if host[key] in failed_ids:
+                    failed_hosts.append(host)
+            elif host['reservable'] is False:
+                if host[key] in active_ids:
+                    recovered_hosts.append(host)
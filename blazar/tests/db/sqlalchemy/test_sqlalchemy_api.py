@@ -483,6 +483,52 @@ class SQLAlchemyDBApiTestCase(tests.DBTestCase):
                           db_api.host_create,
                           _get_fake_host_values(id='1'))
 
+    def test_host_get_all_by_ids(self):
+        db_api.host_create(_get_fake_host_values(id='1'))
+        db_api.host_create(_get_fake_host_values(id='2'))
+        db_api.host_create(_get_fake_host_values(id='3'))
+        self.assertEqual(
+            ['1', '3'],
+            sorted(h['id'] for h in db_api.host_get_all_by_ids(['1', '3'])))
+        self.assertEqual([], db_api.host_get_all_by_ids([]))
+
+    def test_host_get_all_for_polling(self):
+        db_api.host_create(_get_fake_host_values(id='1'))
+        db_api.host_create(_get_fake_host_values(id='2'))
+        db_api.host_update('2', {'reservable': False})
+
+        hosts = sorted(db_api.host_get_all_for_polling(),
+                       key=lambda host: host['id'])
+
+        self.assertEqual(
+            [{'id': '1', 'hypervisor_hostname': None,
+              'hypervisor_type': 'QEMU', 'reservable': True},
+             {'id': '2', 'hypervisor_hostname': None,
+              'hypervisor_type': 'QEMU', 'reservable': False}],
+            hosts)
+
+    def test_host_get_with_allocation_flag(self):
+        db_api.host_create(_get_fake_host_values(id='1'))
+        db_api.host_create(_get_fake_host_values(id='2'))
+        db_api.host_create(_get_fake_host_values(id='3'))
+        db_api.host_allocation_create(
+            _get_fake_host_allocation_values(id='a1', compute_host_id='1'))
+        db_api.host_allocation_create(
+            _get_fake_host_allocation_values(id='a3', compute_host_id='3'))
+        db_api.host_allocation_destroy('a3')
+
+        host, has_allocation = db_api.host_get_with_allocation_flag('1')
+        self.assertEqual('1', host['id'])
+        self.assertTrue(has_allocation)
+        host, has_allocation = db_api.host_get_with_allocation_flag('2')
+        self.assertEqual('2', host['id'])
+        self.assertFalse(has_allocation)
+        host, has_allocation = db_api.host_get_with_allocation_flag('3')
+        self.assertEqual('3', host['id'])
+        self.assertFalse(has_allocation)
+        self.assertEqual((None, False),
+                         db_api.host_get_with_allocation_flag('4'))
+
     def test_search_for_hosts_by_ram(self):
         """Check RAM info search
 
@@ -575,6 +621,25 @@ class SQLAlchemyDBApiTestCase(tests.DBTestCase):
         self.assertEqual(1, len(
             db_api.host_get_all_by_queries(['memory_mb != null'])))
 
+    def test_search_for_hosts_by_tuple_queries(self):
+        host = _get_fake_host_values(mem=8192)
+        host['hypervisor_hostname'] = 'null'
+        db_api.host_create(host)
+        db_api.host_create(_get_fake_host_values(mem=4096))
+
+        self.assertEqual(1, len(
+            db_api.host_get_all_by_queries(
+                [('hypervisor_hostname', '==', 'null')])))
+        self.assertEqual(1, len(
+            db_api.host_get_all_by_queries(
+                [('memory_mb', '>', 4096), 'cpu_info like %Westmere%'])))
+        self.assertEqual(2, len(
+            db_api.host_get_all_by_queries(
+                [('memory_mb', 'in', [4096, 8192])])))
+        self.assertRaises(db_exceptions.BlazarDBInvalidFilter,
+                          db_api.host_get_all_by_queries,
+                          [('memory_mb', '<')])
+
     def test_list_hosts(self):
         db_api.host_create(_get_fake_host_values(id=1))
         db_api.host_create(_get_fake_host_values(id=2))
@@ -592,6 +657,15 @@ class SQLAlchemyDBApiTestCase(tests.DBTestCase):
         db_api.host_update(1, {'status': 'updated'})
         self.assertEqual('updated', db_api.host_get(1)['status'])
 
+    def test_update_host_bulk(self):
+        db_api.host_create(_get_fake_host_values(id=1))
+        db_api.host_create(_get_fake_host_values(id=2))
+        db_api.host_create(_get_fake_host_values(id=3))
+        db_api.host_update_bulk([1, 2], {'reservable': False})
+        self.assertFalse(db_api.host_get(1)['reservable'])
+        self.assertFalse(db_api.host_get(2)['reservable'])
+        self.assertTrue(db_api.host_get(3)['reservable'])
+
     def test_delete_host(self):
         db_api.host_create(_get_fake_host_values(id=1))
         db_api.host_destroy(1)
@@ -615,6 +689,30 @@ class SQLAlchemyDBApiTestCase(tests.DBTestCase):
                           db_api.host_extra_capability_create,
                           _get_fake_host_extra_capabilities(id='1'))
 
+    def test_create_host_extra_capability_bulk(self):
+        db_api.host_extra_capability_create_bulk([
+            _get_fake_host_extra_capabilities(id='1', computehost_id='1'),
+            _get_fake_host_extra_capabilities(id='2', computehost_id='1',
+                                              name='foo', value='bar'),
+        ])
+        res = db_api.host_extra_capability_get_all_per_host('1')
+        self.assertEqual([('foo', 'bar'), ('vgpu', '2')],
+                         sorted((name, capability.capability_value)
+                                for capability, name in res))
+
+    def test_create_duplicated_host_extra_capability_bulk(self):
+        db_api.host_extra_capability_create(
+            _get_fake_host_extra_capabilities(id='1', computehost_id='1'))
+        self.assertRaises(db_exceptions.BlazarDBDuplicateEntry,
+                          db_api.host_extra_capability_create_bulk,
+                          [_get_fake_host_extra_capabilities(
+                              id='2', computehost_id='1', name='foo'),
+                           _get_fake_host_extra_capabilities(
+                               id='1', computehost_id='1')])
+        # Nothing of a failed bulk create is stored
+        self.assertEqual(
+            1, len(db_api.host_extra_capability_get_all_per_host('1')))
+
     def test_get_host_extra_capability_per_id(self):
         db_api.host_extra_capability_create(
             _get_fake_host_extra_capabilities(id='1'))
@@ -629,6 +727,18 @@ class SQLAlchemyDBApiTestCase(tests.DBTestCase):
         res = db_api.host_extra_capability_get_all_per_host('1')
         self.assertEqual(2, len(res))
 
+    def test_host_extra_capability_get_all(self):
+        db_api.host_extra_capability_create(
+            _get_fake_host_extra_capabilities(id='1', computehost_id='2'))
+        db_api.host_extra_capability_create(
+            _get_fake_host_extra_capabilities(id='2', computehost_id='1'))
+        db_api.host_extra_capability_create(
+            _get_fake_host_extra_capabilities(id='3', computehost_id='2'))
+        res = db_api.host_extra_capability_get_all()
+        self.assertEqual(['1', '2', '2'],
+                         [capability.computehost_id
+                          for capability, _ in res])
+
     def test_update_host_extra_capability(self):
         db_api.host_extra_capability_create(
             _get_fake_host_extra_capabilities(id='1'))
@@ -779,6 +889,21 @@ class SQLAlchemyDBApiTestCase(tests.DBTestCase):
         self.assertEqual(1, len(db_api.host_allocation_get_all_by_values(
             reservation_id='1234')))
 
+    def test_host_allocation_count_by_host_ids(self):
+        db_api.host_allocation_create(_get_fake_host_allocation_values(
+            compute_host_id="1", reservation_id="1"))
+        db_api.host_allocation_create(_get_fake_host_allocation_values(
+            compute_host_id="1", reservation_id="1234"))
+        db_api.host_allocation_create(_get_fake_host_allocation_values(
+            compute_host_id="2", reservation_id="1"))
+        db_api.host_allocation_create(_get_fake_host_allocation_values(
+            compute_host_id="3", reservation_id="1"))
+
+        self.assertEqual({'1': 2, '2': 1},
+                         db_api.host_allocation_count_by_host_ids(
+                             ['1', '2', '4']))
+        self.assertEqual({}, db_api.host_allocation_count_by_host_ids([]))
+
     # Event
 
     def test_event_create(self):
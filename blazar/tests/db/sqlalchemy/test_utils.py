@@ -207,6 +207,27 @@ class SQLAlchemyDBUtilsTestCase(tests.DBTestCase):
         self.assertEqual('2099-01-01 00:00',
                          free_periods[1][1].strftime('%Y-%m-%d %H:%M'))
 
+    def test_get_reserved_host_ids(self):
+        """Find the hosts reserved during a period."""
+        self._setup_leases()
+        self.assertEqual({'r1', 'r2'}, db_utils.get_reserved_host_ids(
+            ['r1', 'r2', 'r4'],
+            _get_datetime('2030-01-01 08:00'),
+            _get_datetime('2030-01-01 12:00')))
+        # r1 is free between its leases and the deleted one is ignored
+        self.assertEqual(set(), db_utils.get_reserved_host_ids(
+            ['r1'],
+            _get_datetime('2030-01-01 10:30'),
+            _get_datetime('2030-01-01 13:00')))
+        self.assertEqual(set(), db_utils.get_reserved_host_ids(
+            ['r1'],
+            _get_datetime('2030-01-01 14:30'),
+            _get_datetime('2030-01-01 15:00')))
+        self.assertEqual(set(), db_utils.get_reserved_host_ids(
+            [],
+            _get_datetime('2030-01-01 08:00'),
+            _get_datetime('2030-01-01 12:00')))
+
     def test_get_reserved_periods(self):
         """Find the reserved periods."""
         self._setup_leases()
@@ -60,12 +60,21 @@ class BaseMonitorTestCase(tests.TestCase):
         self.monitor = base_monitor.BaseMonitor(self.monitor_plugins)
 
     def test_start_periodic_healing(self):
-        add_timer = self.patch(threadgroup.ThreadGroup, 'add_timer')
+        add_timer = self.patch(threadgroup.ThreadGroup, 'add_dynamic_timer')
 
         self.monitor.start_periodic_healing()
         add_timer.assert_called_once_with(
-            HEALING_INTERVAL * 60, self.monitor.call_monitor_plugin, None,
-            self.monitor_plugins[0].heal)
+            self.monitor.call_healing_plugin, None, None,
+            self.monitor_plugins[0])
+
+    def test_call_healing_plugin(self):
+        call_monitor_plugin = self.patch(self.monitor, 'call_monitor_plugin')
+
+        result = self.monitor.call_healing_plugin(self.monitor_plugins[0])
+
+        call_monitor_plugin.assert_called_once_with(
+            self.monitor_plugins[0].heal_periodically)
+        self.assertEqual(HEALING_INTERVAL * 60, result)
 
     def test_stop_periodic_healing(self):
         dummy_timer = mock.Mock()
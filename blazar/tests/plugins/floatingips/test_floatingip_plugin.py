@@ -790,7 +790,8 @@ class FloatingIpPluginTest(tests.TestCase):
         fip_plugin.on_end('resource-id1')
 
         self.fip_pool.assert_called_once_with('network-id1')
-        m.delete_reserved_floatingip.assert_called_once_with('172.2.24.100')
+        m.delete_reserved_floatingips.assert_called_once_with(
+            ['172.2.24.100'])
         patch_fip_allocation_destroy.assert_called_once_with('alloc-id1')
 
     def test_matching_fips_not_allocated_fips(self):
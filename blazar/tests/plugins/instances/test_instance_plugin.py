@@ -1216,6 +1216,18 @@ class TestVirtualInstancePlugin(tests.TestCase):
             dummy_reservation, list(failed_host.values()))
         self.assertEqual({}, result)
 
+    def test_heal_reservations_no_failed_resources(self):
+        plugin = instance_plugin.VirtualInstancePlugin()
+        get_reservations = self.patch(db_utils,
+                                      'get_reservations_by_host_ids')
+
+        result = plugin.heal_reservations(
+            [],
+            datetime.datetime(2020, 1, 1, 12, 00),
+            datetime.datetime(2020, 1, 1, 13, 00))
+        get_reservations.assert_not_called()
+        self.assertEqual({}, result)
+
     def test_heal_reservations_before_start_and_missing_resources(self):
         plugin = instance_plugin.VirtualInstancePlugin()
         failed_host = {'id': '1'}
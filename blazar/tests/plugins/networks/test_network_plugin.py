@@ -32,6 +32,7 @@ from blazar.utils.openstack import base
 from blazar.utils.openstack import ironic
 from blazar.utils.openstack import neutron
 from blazar.utils.openstack import nova
+from blazar.utils import plugins as plugins_utils
 from blazar.utils import trusts
 
 CONF = cfg.CONF
@@ -95,6 +96,7 @@ class NetworkPluginTestCase(tests.TestCase):
             'buzz': 'word',
         }
         self.fake_network_plugin.setup(None)
+        self.network_plugin._convert_requirements.cache_clear()
 
         self.trusts = trusts
         self.trust_ctx = self.patch(self.trusts, 'create_ctx_from_trust')
@@ -1083,6 +1085,24 @@ class NetworkPluginTestCase(tests.TestCase):
         self.db_list_resource_properties.assert_called_once_with(
             'network')
 
+    def test_filter_networks_by_properties_cached(self):
+        convert_requirements = self.patch(
+            plugins_utils, 'convert_requirements')
+        convert_requirements.return_value = ['physical_network == physnet1']
+        network_get_all_by_queries = self.patch(
+            self.db_api, 'network_get_all_by_queries')
+        properties = '["=", "$physical_network", "physnet1"]'
+
+        for _ in range(2):
+            self.fake_network_plugin._filter_networks_by_properties(
+                properties, '')
+
+        convert_requirements.assert_called_once_with(properties)
+        network_get_all_by_queries.assert_has_calls([
+            mock.call(['physical_network == physnet1']),
+            mock.call(['physical_network == physnet1']),
+        ])
+
     def test_update_resource_property(self):
         resource_property_values = {
             'resource_type': 'network',
@@ -0,0 +1,202 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from blazar.manager import exceptions as manager_ex
+from blazar.plugins.networks import storage_plugin
+from blazar import tests
+from blazar.utils.openstack import manila
+from blazar.utils.openstack import neutron
+
+
+class StoragePluginTestCase(tests.TestCase):
+
+    def setUp(self):
+        super(StoragePluginTestCase, self).setUp()
+        self.neutron_client = (
+            self.patch(neutron, 'BlazarNeutronClient').return_value)
+        self.neutron_client.list_subnetpools.return_value = {
+            'subnetpools': [{'id': 'pool-id', 'prefixes': ['10.0.0.0/16']}]}
+        self.neutron_client.list_routers.return_value = {
+            'routers': [{'id': 'router-id'}]}
+        self.manila_client = (
+            self.patch(manila, 'BlazarManilaClient').return_value)
+        self.plugin = storage_plugin.StoragePlugin()
+
+    def _share(self, share_id, project_id='project1', is_public=False):
+        return mock.MagicMock(id=share_id, project_id=project_id,
+                              is_public=is_public)
+
+    def _rule(self, rule_id, access_to, access_level='rw'):
+        return mock.MagicMock(id=rule_id, access_to=access_to,
+                              access_level=access_level)
+
+    def _set_router_interfaces(self, project_cidrs):
+        self.plugin._get_ganesha_router_interfaces = mock.MagicMock(
+            return_value=project_cidrs)
+
+    def test_get_ganesha_router_interfaces(self):
+        self.neutron_client.list_ports.return_value = {'ports': [
+            {'fixed_ips': [{'subnet_id': 'subnet1'}]},
+            {'fixed_ips': [{'subnet_id': 'subnet2'},
+                           {'subnet_id': 'subnet1'}]},
+            {'fixed_ips': [{'subnet_id': 'subnet3'}]},
+            {'fixed_ips': [{'subnet_id': 'subnet4'}]},
+        ]}
+        self.neutron_client.list_subnets.return_value = {'subnets': [
+            {'id': 'subnet1', 'tenant_id': 'project1',
+             'cidr': '10.0.1.0/24'},
+            {'id': 'subnet2', 'tenant_id': 'project2',
+             'cidr': '10.0.2.0/24'},
+            {'id': 'subnet3', 'tenant_id': 'project1',
+             'cidr': '10.0.3.0/24'},
+        ]}
+        log_warning = self.patch(storage_plugin.LOG, 'warning')
+
+        result = self.plugin._get_ganesha_router_interfaces()
+
+        self.assertEqual({
+            'project1': ['10.0.1.0/24', '10.0.1.0/24', '10.0.3.0/24'],
+            'project2': ['10.0.2.0/24'],
+        }, result)
+        self.neutron_client.list_ports.assert_called_once_with(
+            device_id='router-id')
+        self.neutron_client.list_subnets.assert_called_once_with(
+            id=['subnet1', 'subnet2', 'subnet3', 'subnet4'])
+        log_warning.assert_called_once()
+        self.assertIn('subnet4', log_warning.call_args[0][0])
+
+    def test_get_ganesha_router_interfaces_no_ports(self):
+        self.neutron_client.list_ports.return_value = {'ports': []}
+
+        self.assertEqual({}, self.plugin._get_ganesha_router_interfaces())
+        self.neutron_client.list_subnets.assert_not_called()
+
+    def test_set_access_rules_skips_unchanged_share(self):
+        self._set_router_interfaces({'project1': ['10.0.1.0/24']})
+        self.manila_client.shares.list.return_value = [
+            self._share('share1')]
+        self.manila_client.shares.access_list.return_value = [
+            self._rule('rule1', '10.0.1.0/24')]
+
+        self.plugin._set_manila_share_access_rules(None, None)
+
+        self.manila_client.shares.allow.assert_not_called()
+        self.manila_client.shares.deny.assert_not_called()
+
+    def test_set_access_rules_updates_ro_state(self):
+        self._set_router_interfaces({'project1': ['10.0.1.0/24']})
+        self.manila_client.shares.list.return_value = [
+            self._share('share1', is_public=True)]
+        self.manila_client.shares.access_list.return_value = [
+            self._rule('rule1', '10.0.1.0/24')]
+
+        self.plugin._set_manila_share_access_rules(None, None)
+
+        self.manila_client.shares.allow.assert_called_once_with(
+            'share1', 'ip', '10.0.0.0/16', 'ro')
+        self.manila_client.shares.deny.assert_not_called()
+
+    def test_set_access_rules_removes_ro_rules(self):
+        self._set_router_interfaces({'project1': ['10.0.1.0/24']})
+        self.manila_client.shares.list.return_value = [
+            self._share('share1')]
+        self.manila_client.shares.access_list.return_value = [
+            self._rule('rule1', '10.0.1.0/24'),
+            self._rule('rule2', '10.0.0.0/16', access_level='ro')]
+
+        self.plugin._set_manila_share_access_rules(None, None)
+
+        self.manila_client.shares.allow.assert_not_called()
+        self.manila_client.shares.deny.assert_called_once_with(
+            'share1', 'rule2')
+
+    def test_set_access_rules_per_share(self):
+        self._set_router_interfaces({'project1': ['10.0.1.0/24'],
+                                     'project2': ['10.0.2.0/24']})
+        self.manila_client.shares.list.return_value = [
+            self._share('share1'),
+            self._share('share2', project_id='project2'),
+            self._share('share3', project_id='project3'),
+        ]
+
+        def fake_access_list(share_id):
+            if share_id == 'share1':
+                raise Exception('access_list failed')
+            if share_id == 'share3':
+                return [self._rule('rule3', '10.0.3.0/24')]
+            return []
+
+        self.manila_client.shares.access_list.side_effect = fake_access_list
+        log_exception = self.patch(storage_plugin.LOG, 'exception')
+
+        self.plugin._set_manila_share_access_rules(None, None)
+
+        self.manila_client.shares.list.assert_called_once_with(
+            search_opts={
+                'all_tenants': 1,
+                'share_type': 'default_share_type',
+                'status': 'available',
+            })
+        self.manila_client.shares.allow.assert_called_once_with(
+            'share2', 'ip', '10.0.2.0/24', 'rw')
+        self.manila_client.shares.deny.assert_called_once_with(
+            'share3', 'rule3')
+        log_exception.assert_called_once_with(
+            'Failed to manage access rules for share share1')
+
+    def test_set_access_rules_router_interfaces_failure(self):
+        self.plugin._get_ganesha_router_interfaces = mock.MagicMock(
+            side_effect=Exception('neutron failed'))
+
+        self.assertRaises(
+            Exception,
+            self.plugin._set_manila_share_access_rules, None, None)
+        self.manila_client.shares.list.assert_called_once()
+        self.manila_client.shares.access_list.assert_not_called()
+
+    def test_bulk_deny_no_rules(self):
+        self.plugin._bulk_deny(self.manila_client, 'share1', [])
+
+        self.manila_client.shares.deny.assert_not_called()
+
+    def test_bulk_deny_single_rule(self):
+        self.plugin._bulk_deny(self.manila_client, 'share1', ['rule1'])
+
+        self.manila_client.shares.deny.assert_called_once_with(
+            'share1', 'rule1')
+
+    def test_bulk_deny_multiple_rules(self):
+        self.plugin._bulk_deny(
+            self.manila_client, 'share1', ['rule1', 'rule2', 'rule3'])
+
+        self.manila_client.shares.deny.assert_has_calls([
+            mock.call('share1', 'rule1'),
+            mock.call('share1', 'rule2'),
+            mock.call('share1', 'rule3'),
+        ], any_order=True)
+        self.assertEqual(3, self.manila_client.shares.deny.call_count)
+
+    def test_bulk_deny_failure(self):
+        def fake_deny(share_id, rule_id):
+            if rule_id != 'rule2':
+                raise Exception('deny failed')
+
+        self.manila_client.shares.deny.side_effect = fake_deny
+
+        self.assertRaisesRegex(
+            manager_ex.ShareAccessDenyFailed, 'rule1, rule3',
+            self.plugin._bulk_deny,
+            self.manila_client, 'share1', ['rule1', 'rule2', 'rule3'])
+        self.assertEqual(3, self.manila_client.shares.deny.call_count)
@@ -15,6 +15,8 @@
 
 import collections
 import datetime
+import threading
+import time
 from unittest import mock
 
 import ddt
@@ -126,6 +128,10 @@ class PhysicalHostPluginTestCase(tests.TestCase):
 
         self.db_host_get = self.patch(self.db_api, 'host_get')
         self.db_host_get.return_value = self.fake_host
+        self.db_host_get_with_allocation_flag = self.patch(
+            self.db_api, 'host_get_with_allocation_flag')
+        self.db_host_get_with_allocation_flag.return_value = (
+            self.fake_host, False)
         self.db_host_list = self.patch(self.db_api, 'host_list')
         self.db_host_create = self.patch(self.db_api, 'host_create')
         self.db_host_update = self.patch(self.db_api, 'host_update')
@@ -139,6 +145,8 @@ class PhysicalHostPluginTestCase(tests.TestCase):
 
         self.db_host_extra_capability_create = self.patch(
             self.db_api, 'host_extra_capability_create')
+        self.db_host_extra_capability_create_bulk = self.patch(
+            self.db_api, 'host_extra_capability_create_bulk')
 
         self.db_host_extra_capability_update = self.patch(
             self.db_api, 'host_extra_capability_update')
@@ -186,6 +194,8 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         self.trust_create = self.patch(self.trusts, 'create_trust')
 
         self.ServerManager = nova.ServerManager
+        self.host_plugin._convert_requirements.cache_clear()
+        self.host_plugin._requirement_keys.cache_clear()
 
     def reservation_allocation_dict(self, r_id, l_id, p_id, h_ids):
         return {
@@ -213,6 +223,26 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         self.db_host_list.assert_called_once_with()
         del self.service_utils
 
+    def test_list_hosts_with_extra_capabilities(self):
+        self.db_host_list.return_value = [{'id': '1'}, {'id': '2'}]
+        host_extra_capability_get_all = self.patch(
+            self.db_api, 'host_extra_capability_get_all')
+        host_extra_capability_get_all.return_value = [
+            (mock.MagicMock(computehost_id='1', capability_value='bar'),
+             'foo'),
+            (mock.MagicMock(computehost_id='1', capability_value='word'),
+             'buzz'),
+        ]
+        get_computehost = self.patch(self.fake_phys_plugin,
+                                     'get_computehost')
+
+        hosts = self.fake_phys_plugin.list_computehosts({})
+
+        self.assertEqual([{'id': '1', 'foo': 'bar', 'buzz': 'word'},
+                          {'id': '2'}], hosts)
+        host_extra_capability_get_all.assert_called_once_with()
+        get_computehost.assert_not_called()
+
     def test_create_host_without_extra_capabilities(self):
         self.get_extra_capabilities.return_value = {}
         host = self.fake_phys_plugin.create_computehost(self.fake_host)
@@ -234,7 +264,9 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         host = self.fake_phys_plugin.create_computehost(fake_request)
         self.db_host_create.assert_called_once_with(self.fake_host)
         self.prov_create.assert_called_once_with('hypvsr1')
-        self.db_host_extra_capability_create.assert_called_once_with(fake_capa)
+        self.db_host_extra_capability_create_bulk.assert_called_once_with(
+            [fake_capa])
+        self.db_host_extra_capability_create.assert_not_called()
         self.assertEqual(fake_host, host)
 
     def test_create_host_with_capabilities_too_long(self):
@@ -291,12 +323,34 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         fake_request = fake_host.copy()
         self.get_extra_capabilities.return_value = {'foo': 'bar'}
         self.db_host_create.return_value = self.fake_host
+        self.db_host_extra_capability_create_bulk.side_effect = (
+            db_exceptions.BlazarDBException)
         fake = self.db_host_extra_capability_create
         fake.side_effect = fake_db_host_extra_capability_create
         self.assertRaises(manager_exceptions.CantAddExtraCapability,
                           self.fake_phys_plugin.create_computehost,
                           fake_request)
 
+    def test_create_host_having_issue_with_one_extra_capability(self):
+        def fake_db_host_extra_capability_create(values):
+            if values['capability_name'] == 'buzz':
+                raise db_exceptions.BlazarDBException
+        fake_request = self.fake_host.copy()
+        fake_request.update({'foo': 'bar', 'buzz': 'word'})
+        self.get_host_details.return_value = self.fake_host.copy()
+        self.db_host_create.return_value = self.fake_host
+        self.db_host_extra_capability_create_bulk.side_effect = (
+            db_exceptions.BlazarDBException)
+        fake = self.db_host_extra_capability_create
+        fake.side_effect = fake_db_host_extra_capability_create
+
+        exc = self.assertRaises(manager_exceptions.CantAddExtraCapability,
+                                self.fake_phys_plugin.create_computehost,
+                                fake_request)
+        self.assertIn('buzz', str(exc))
+        self.assertNotIn('foo', str(exc))
+        self.assertEqual(2, fake.call_count)
+
     def test_update_host(self):
         host_values = {'foo': 'baz'}
 
@@ -335,6 +389,22 @@ class PhysicalHostPluginTestCase(tests.TestCase):
                           self.fake_phys_plugin.update_computehost,
                           self.fake_host_id, host_values)
 
+    def test_update_host_with_unchanged_capability(self):
+        host_values = {'foo': 'bar'}
+        self.db_host_get.return_value = self.fake_host
+
+        host = self.fake_phys_plugin.update_computehost(self.fake_host_id,
+                                                        host_values)
+
+        expected = self.fake_host.copy()
+        expected.update({'foo': 'bar', 'buzz': 'word'})
+        self.assertEqual(expected, host)
+        self.get_extra_capabilities.assert_called_once_with(
+            self.fake_host_id)
+        self.db_host_extra_capability_get_all_per_name.assert_not_called()
+        self.db_host_extra_capability_update.assert_not_called()
+        self.db_host_extra_capability_create.assert_not_called()
+
     def test_update_host_with_new_extra_capability(self):
         host_values = {'qux': 'word'}
 
@@ -395,38 +465,62 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         fake_get_plugin_reservation.assert_called_once_with(
             plugin.RESOURCE_TYPE, 'resource-1')
 
+    def test_update_host_with_capability_used_by_several_reservations(self):
+        host_values = {'foo': 'buzz'}
+
+        self.db_host_extra_capability_get_all_per_name.return_value = [
+            ({'id': 'extra_id1',
+              'computehost_id': self.fake_host_id,
+              'capability_value': 'bar'},
+             'foo'),
+        ]
+        fake_get_reservations = self.patch(self.db_utils,
+                                           'get_reservations_by_host_id')
+        fake_get_reservations.return_value = [
+            {'resource_type': plugin.RESOURCE_TYPE,
+             'resource_id': 'resource-1'},
+            {'resource_type': plugin.RESOURCE_TYPE,
+             'resource_id': 'resource-2'},
+        ]
+        fake_get_plugin_reservation = self.patch(self.db_utils,
+                                                 'get_plugin_reservation')
+        fake_get_plugin_reservation.return_value = {
+            'resource_properties': '["==", "$buzz", "word"]'
+        }
+        convert_requirements = self.patch(
+            self.host_plugin.plugins_utils, 'convert_requirements')
+        convert_requirements.return_value = ['buzz == word']
+        host_extra_capability_update = self.patch(
+            self.db_api, 'host_extra_capability_update')
+
+        self.fake_phys_plugin.update_computehost(self.fake_host_id,
+                                                 host_values)
+
+        convert_requirements.assert_called_once_with(
+            '["==", "$buzz", "word"]')
+        host_extra_capability_update.assert_called_once_with(
+            'extra_id1', {'capability_value': 'buzz'})
+
     def test_delete_host(self):
-        host_allocation_get_all = self.patch(
-            self.db_api,
-            'host_allocation_get_all_by_values')
-        host_allocation_get_all.return_value = []
         self.fake_phys_plugin.delete_computehost(self.fake_host_id)
 
+        self.db_host_get_with_allocation_flag.assert_called_once_with(
+            self.fake_host_id)
         self.db_host_destroy.assert_called_once_with(self.fake_host_id)
         self.prov_delete.assert_called_once_with('hypvsr1')
         self.get_servers_per_host.assert_called_once_with(
             self.fake_host["hypervisor_hostname"])
 
     def test_delete_host_reserved(self):
-        host_allocation_get_all = self.patch(
-            self.db_api,
-            'host_allocation_get_all_by_values')
-        host_allocation_get_all.return_value = [
-            {
-                'id': 'dd305477-4df8-4547-87f6-69069ee546a6',
-                'compute_host_id': self.fake_host_id
-            }
-        ]
+        self.db_host_get_with_allocation_flag.return_value = (
+            self.fake_host, True)
 
         self.assertRaises(manager_exceptions.CantDeleteHost,
                           self.fake_phys_plugin.delete_computehost,
                           self.fake_host_id)
+        self.db_host_destroy.assert_not_called()
 
     def test_delete_host_having_vms(self):
-        host_allocation_get_all = self.patch(
-            self.db_api,
-            'host_allocation_get_all_by_values')
-        host_allocation_get_all.return_value = []
         self.get_servers_per_host.return_value = ['server1', 'server2']
         self.assertRaises(manager_exceptions.HostHavingServers,
                           self.fake_phys_plugin.delete_computehost,
@@ -435,7 +529,7 @@ class PhysicalHostPluginTestCase(tests.TestCase):
             self.fake_host["hypervisor_hostname"])
 
     def test_delete_host_not_existing_in_db(self):
-        self.db_host_get.return_value = None
+        self.db_host_get_with_allocation_flag.return_value = (None, False)
         self.assertRaises(manager_exceptions.HostNotFound,
                           self.fake_phys_plugin.delete_computehost,
                           self.fake_host_id)
@@ -443,10 +537,6 @@ class PhysicalHostPluginTestCase(tests.TestCase):
     def test_delete_host_issuing_rollback(self):
         def fake_db_host_destroy(*args, **kwargs):
             raise db_exceptions.BlazarDBException
-        host_allocation_get_all = self.patch(
-            self.db_api,
-            'host_allocation_get_all_by_values')
-        host_allocation_get_all.return_value = []
         self.db_host_destroy.side_effect = fake_db_host_destroy
         self.assertRaises(manager_exceptions.CantDeleteHost,
                           self.fake_phys_plugin.delete_computehost,
@@ -1191,7 +1281,7 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         matching_hosts.assert_called_with(
             '["=", "$memory_mb", "16384"]',
             '',
-            '1-1',
+            (1, 1),
             datetime.datetime(2017, 7, 12, 20, 00),
             datetime.datetime(2017, 7, 12, 21, 00)
         )
@@ -1260,7 +1350,7 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         matching_hosts.assert_called_with(
             '["=", "$memory_mb", "16384"]',
             '',
-            '1-1',
+            (1, 1),
             datetime.datetime(2017, 7, 12, 20, 00),
             datetime.datetime(2017, 7, 12, 21, 00)
         )
@@ -1386,7 +1476,7 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         matching_hosts.assert_called_with(
             '["=", "$memory_mb", "16384"]',
             '',
-            '0-1',
+            (0, 1),
             datetime.datetime(2017, 7, 12, 20, 00),
             datetime.datetime(2017, 7, 12, 21, 00)
         )
@@ -1471,7 +1561,7 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         matching_hosts.assert_called_with(
             '["=", "$memory_mb", "16384"]',
             '',
-            '0-1',
+            (0, 1),
             datetime.datetime(2017, 7, 12, 20, 00),
             datetime.datetime(2017, 7, 12, 21, 00)
         )
@@ -1543,7 +1633,7 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         matching_hosts.assert_called_with(
             '["=", "$memory_mb", "16384"]',
             '',
-            '0-1',
+            (0, 1),
             datetime.datetime(2017, 7, 12, 20, 00),
             datetime.datetime(2017, 7, 12, 21, 00)
         )
@@ -1663,7 +1753,7 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         matching_hosts.assert_called_with(
             '["=", "$memory_mb", "32768"]',
             '',
-            '1-1',
+            (1, 1),
             datetime.datetime(2017, 7, 12, 20, 00),
             datetime.datetime(2017, 7, 12, 21, 00)
         )
@@ -1736,13 +1826,15 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         host_allocation_get_all_by_values.return_value = [
             {'compute_host_id': 'host1'},
         ]
-        host_get = self.patch(self.db_api, 'host_get')
-        host_get.return_value = {'hypervisor_hostname': 'host1_hostname'}
+        host_get_all_by_ids = self.patch(self.db_api, 'host_get_all_by_ids')
+        host_get_all_by_ids.return_value = [
+            {'hypervisor_hostname': 'host1_hostname'}]
         add_computehost = self.patch(
             self.nova.ReservationPool, 'add_computehost')
 
         self.fake_phys_plugin.on_start('04de74e8-193a-49d2-9ab8-cba7b49e45e8')
 
+        host_get_all_by_ids.assert_called_once_with(['host1'])
         add_computehost.assert_called_with(1, ['host1_hostname'])
 
     def test_before_end_with_no_action(self):
@@ -1810,12 +1902,41 @@ class PhysicalHostPluginTestCase(tests.TestCase):
             '04de74e8-193a-49d2-9ab8-cba7b49e45e8', {'status': 'completed'})
         host_allocation_destroy.assert_called_with(
             'bfa9aa0b-8042-43eb-a4e6-4555838bf64f')
-        list_servers.assert_called_with(search_opts={'node': 'host',
+        list_servers.assert_called_with(detailed=False,
+                                        search_opts={'node': 'host',
                                                      'all_tenants': 1})
         delete_server.assert_any_call(server='server1')
         delete_server.assert_any_call(server='server2')
         delete_pool.assert_called_with(1)
 
+    def test_on_end_deletes_servers_of_all_hosts(self):
+        host_reservation_get = self.patch(self.db_api, 'host_reservation_get')
+        host_reservation_get.return_value = {
+            'id': '04de74e8-193a-49d2-9ab8-cba7b49e45e8',
+            'reservation_id': '593e7028-c0d1-4d76-8642-2ffd890b324c',
+            'aggregate_id': 1
+        }
+        self.patch(self.db_api, 'host_reservation_update')
+        self.patch(self.db_api,
+                   'host_allocation_get_all_by_values').return_value = []
+        get_computehosts = self.patch(self.nova.ReservationPool,
+                                      'get_computehosts')
+        get_computehosts.return_value = ['host1', 'host2']
+        list_servers = self.patch(self.ServerManager, 'list')
+        list_servers.side_effect = [['server1', 'server2'], ['server3']]
+        delete_server = self.patch(self.ServerManager, 'delete')
+        delete_server.side_effect = [None, Exception('delete failed'), None]
+        self.patch(self.nova.ReservationPool, 'delete')
+
+        self.fake_phys_plugin.on_end('04de74e8-193a-49d2-9ab8-cba7b49e45e8')
+
+        self.assertEqual(3, delete_server.call_count)
+        delete_server.assert_has_calls([
+            mock.call(server='server1'),
+            mock.call(server='server2'),
+            mock.call(server='server3'),
+        ], any_order=True)
+
     def test_on_end_without_instances(self):
         host_reservation_get = self.patch(self.db_api, 'host_reservation_get')
         host_reservation_get.return_value = {
@@ -1920,7 +2041,8 @@ class PhysicalHostPluginTestCase(tests.TestCase):
             datetime.datetime(2020, 1, 1, 12, 00),
             datetime.datetime(2020, 1, 1, 13, 00))
         reallocate.assert_called_once_with(
-            dummy_reservation['computehost_allocations'][0])
+            dummy_reservation['computehost_allocations'][0], now=mock.ANY,
+            reservation=dummy_reservation, lease=dummy_lease)
         self.assertEqual({}, result)
 
     def test_heal_reservations_before_start_and_missing_resources(self):
@@ -1991,7 +2113,8 @@ class PhysicalHostPluginTestCase(tests.TestCase):
             datetime.datetime(2020, 1, 1, 12, 00),
             datetime.datetime(2020, 1, 1, 13, 00))
         reallocate.assert_called_once_with(
-            dummy_reservation['computehost_allocations'][0])
+            dummy_reservation['computehost_allocations'][0], now=mock.ANY,
+            reservation=dummy_reservation, lease=dummy_lease)
         self.assertEqual(
             {dummy_reservation['id']: {'missing_resources': True}},
             result)
@@ -2068,7 +2191,8 @@ class PhysicalHostPluginTestCase(tests.TestCase):
             datetime.datetime(2020, 1, 1, 12, 00),
             datetime.datetime(2020, 1, 1, 13, 00))
         reallocate.assert_called_once_with(
-            dummy_reservation['computehost_allocations'][0])
+            dummy_reservation['computehost_allocations'][0], now=mock.ANY,
+            reservation=dummy_reservation, lease=dummy_lease)
         self.assertEqual(
             {dummy_reservation['id']: {'resources_changed': True}},
             result)
@@ -2138,11 +2262,119 @@ class PhysicalHostPluginTestCase(tests.TestCase):
             datetime.datetime(2020, 1, 1, 12, 00),
             datetime.datetime(2020, 1, 1, 13, 00))
         reallocate.assert_called_once_with(
-            dummy_reservation['computehost_allocations'][0])
+            dummy_reservation['computehost_allocations'][0], now=mock.ANY,
+            reservation=dummy_reservation, lease=dummy_lease)
         self.assertEqual(
             {dummy_reservation['id']: {'missing_resources': True}},
             result)
 
+    def test_heal_reservations_no_failed_resources(self):
+        get_reservations = self.patch(self.db_utils,
+                                      'get_reservations_by_host_ids')
+        reallocate = self.patch(self.fake_phys_plugin.monitor, '_reallocate')
+
+        result = self.fake_phys_plugin.monitor.heal_reservations(
+            [],
+            datetime.datetime(2020, 1, 1, 12, 00),
+            datetime.datetime(2020, 1, 1, 13, 00))
+        get_reservations.assert_not_called()
+        reallocate.assert_not_called()
+        self.assertEqual({}, result)
+
+    def test_heal_reservations_shares_lookups_and_now(self):
+        failed_host = {'id': '1'}
+        dummy_reservation = {
+            'id': 'rsrv-1',
+            'resource_type': plugin.RESOURCE_TYPE,
+            'lease_id': 'lease-1',
+            'status': 'pending',
+            'computehost_allocations': [
+                {'id': 'alloc-1', 'compute_host_id': failed_host['id'],
+                 'reservation_id': 'rsrv-1'},
+                {'id': 'alloc-2', 'compute_host_id': failed_host['id'],
+                 'reservation_id': 'rsrv-1'},
+            ]
+        }
+        get_reservations = self.patch(self.db_utils,
+                                      'get_reservations_by_host_ids')
+        get_reservations.return_value = [dummy_reservation]
+        # Use a monitor of its own, whatever the singleton was created with
+        patcher = mock.patch.object(host_plugin.PhysicalHostMonitorPlugin,
+                                    '_instance', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        monitor = host_plugin.PhysicalHostMonitorPlugin(
+            **host_plugin.MONITOR_ARGS)
+        reallocate = mock.Mock(return_value=True)
+        monitor.register_reallocater(reallocate)
+        reservation_get = self.patch(self.db_api, 'reservation_get')
+        reservation_get.return_value = dummy_reservation
+        dummy_lease = {'name': 'lease-name'}
+        lease_get = self.patch(self.db_api, 'lease_get')
+        lease_get.return_value = dummy_lease
+        now = datetime.datetime(2020, 1, 1, 11, 00)
+
+        with mock.patch.object(datetime, 'datetime',
+                               mock.Mock(wraps=datetime.datetime)) as patched:
+            patched.utcnow.side_effect = [
+                now, datetime.datetime(2020, 1, 1, 11, 30)]
+            result = monitor.heal_reservations(
+                [failed_host],
+                datetime.datetime(2020, 1, 1, 12, 00),
+                datetime.datetime(2020, 1, 1, 13, 00))
+
+        reallocate.assert_has_calls([
+            mock.call(dummy_reservation['computehost_allocations'][0],
+                      now=now, reservation=dummy_reservation,
+                      lease=dummy_lease),
+            mock.call(dummy_reservation['computehost_allocations'][1],
+                      now=now, reservation=dummy_reservation,
+                      lease=dummy_lease),
+        ])
+        # The reservation and its lease are looked up once for both
+        # allocations
+        reservation_get.assert_called_once_with('rsrv-1')
+        lease_get.assert_called_once_with('lease-1')
+        self.assertEqual({}, result)
+
+    def test_heal_reservations_skips_failed_lookup(self):
+        failed_host = {'id': '1'}
+        reservations = [{
+            'id': rsrv_id,
+            'resource_type': plugin.RESOURCE_TYPE,
+            'lease_id': 'lease-1',
+            'status': 'pending',
+            'computehost_allocations': [
+                {'id': 'alloc-' + rsrv_id,
+                 'compute_host_id': failed_host['id'],
+                 'reservation_id': rsrv_id}]
+        } for rsrv_id in ('rsrv-1', 'rsrv-2')]
+        get_reservations = self.patch(self.db_utils,
+                                      'get_reservations_by_host_ids')
+        get_reservations.return_value = reservations
+        patcher = mock.patch.object(host_plugin.PhysicalHostMonitorPlugin,
+                                    '_instance', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        monitor = host_plugin.PhysicalHostMonitorPlugin(
+            **host_plugin.MONITOR_ARGS)
+        reallocate = mock.Mock(return_value=False)
+        monitor.register_reallocater(reallocate)
+        reservation_get = self.patch(self.db_api, 'reservation_get')
+        reservation_get.side_effect = [Exception('db error'),
+                                       reservations[1]]
+        self.patch(self.db_api, 'lease_get').return_value = {}
+
+        result = monitor.heal_reservations(
+            [failed_host],
+            datetime.datetime(2020, 1, 1, 12, 00),
+            datetime.datetime(2020, 1, 1, 13, 00))
+
+        self.assertEqual({'rsrv-2': {'missing_resources': True}}, result)
+        reallocate.assert_called_once_with(
+            reservations[1]['computehost_allocations'][0], now=mock.ANY,
+            reservation=reservations[1], lease={})
+
     def test_reallocate_before_start(self):
         failed_host = {'id': '1'}
         new_host = {'id': '2'}
@@ -2189,7 +2421,7 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         matching_hosts.assert_called_once_with(
             dummy_reservation['hypervisor_properties'],
             dummy_reservation['resource_properties'],
-            '1-1', dummy_lease['start_date'], dummy_lease['end_date'])
+            (1, 1), dummy_lease['start_date'], dummy_lease['end_date'])
         alloc_update.assert_called_once_with(
             dummy_allocation['id'],
             {'compute_host_id': new_host['id']})
@@ -2248,7 +2480,7 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         matching_hosts.assert_called_once_with(
             dummy_reservation['hypervisor_properties'],
             dummy_reservation['resource_properties'],
-            '1-1', datetime.datetime(2020, 1, 1, 13, 00),
+            (1, 1), datetime.datetime(2020, 1, 1, 13, 00),
             dummy_lease['end_date'])
         alloc_update.assert_called_once_with(
             dummy_allocation['id'],
@@ -2303,14 +2535,11 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         matching_hosts.assert_called_once_with(
             dummy_reservation['hypervisor_properties'],
             dummy_reservation['resource_properties'],
-            '1-1', dummy_lease['start_date'], dummy_lease['end_date'])
+            (1, 1), dummy_lease['start_date'], dummy_lease['end_date'])
         alloc_destroy.assert_called_once_with(dummy_allocation['id'])
         self.assertEqual(False, result)
 
     def test_matching_hosts_not_allocated_hosts(self):
-        def host_allocation_get_all_by_values(**kwargs):
-            if kwargs['compute_host_id'] == 'host1':
-                return True
         host_get = self.patch(
             self.db_api,
             'reservable_host_get_all_by_queries')
@@ -2321,27 +2550,22 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         ]
         host_get = self.patch(
             self.db_api,
-            'host_allocation_get_all_by_values')
-        host_get.side_effect = host_allocation_get_all_by_values
-        host_get = self.patch(
+            'host_allocation_count_by_host_ids')
+        host_get.return_value = {'host1': 1}
+        get_reserved_host_ids = self.patch(
             self.db_utils,
-            'get_free_periods')
-        host_get.return_value = [
-            (datetime.datetime(2013, 12, 19, 20, 00),
-             datetime.datetime(2013, 12, 19, 21, 00)),
-        ]
+            'get_reserved_host_ids')
+        get_reserved_host_ids.return_value = set()
         result = self.fake_phys_plugin._matching_hosts(
-            '[]', '[]', '1-3',
+            '[]', '[]', (1, 3),
             datetime.datetime(2013, 12, 19, 20, 00),
             datetime.datetime(2013, 12, 19, 21, 00),
             None
         )
         self.assertEqual(set(['host2', 'host3']), set(result))
+        get_reserved_host_ids.assert_not_called()
 
     def test_matching_hosts_allocated_hosts(self):
-        def host_allocation_get_all_by_values(**kwargs):
-            if kwargs['compute_host_id'] == 'host1':
-                return True
         host_get = self.patch(
             self.db_api,
             'reservable_host_get_all_by_queries')
@@ -2352,27 +2576,50 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         ]
         host_get = self.patch(
             self.db_api,
-            'host_allocation_get_all_by_values')
-        host_get.side_effect = host_allocation_get_all_by_values
-        host_get = self.patch(
+            'host_allocation_count_by_host_ids')
+        host_get.return_value = {'host1': 1}
+        get_reserved_host_ids = self.patch(
             self.db_utils,
-            'get_free_periods')
+            'get_reserved_host_ids')
+        get_reserved_host_ids.return_value = set()
+        result = self.fake_phys_plugin._matching_hosts(
+            '[]', '[]', (3, 3),
+            datetime.datetime(2013, 12, 19, 20, 00),
+            datetime.datetime(2013, 12, 19, 21, 00),
+            None
+        )
+        self.assertEqual(set(['host1', 'host2', 'host3']), set(result))
+        get_reserved_host_ids.assert_called_once_with(
+            ['host1'],
+            datetime.datetime(2013, 12, 19, 20, 00),
+            datetime.datetime(2013, 12, 19, 21, 00))
+
+    def test_matching_hosts_reserved_allocated_hosts(self):
+        host_get = self.patch(
+            self.db_api,
+            'reservable_host_get_all_by_queries')
         host_get.return_value = [
-            (datetime.datetime(2013, 12, 19, 20, 00),
-             datetime.datetime(2013, 12, 19, 21, 00)),
+            {'id': 'host1'},
+            {'id': 'host2'},
+            {'id': 'host3'},
         ]
+        host_get = self.patch(
+            self.db_api,
+            'host_allocation_count_by_host_ids')
+        host_get.return_value = {'host1': 1}
+        get_reserved_host_ids = self.patch(
+            self.db_utils,
+            'get_reserved_host_ids')
+        get_reserved_host_ids.return_value = {'host1'}
         result = self.fake_phys_plugin._matching_hosts(
-            '[]', '[]', '3-3',
+            '[]', '[]', (3, 3),
             datetime.datetime(2013, 12, 19, 20, 00),
             datetime.datetime(2013, 12, 19, 21, 00),
             None
         )
-        self.assertEqual(set(['host1', 'host2', 'host3']), set(result))
+        self.assertEqual([], result)
 
     def test_matching_hosts_allocated_hosts_with_cleaning_time(self):
-        def host_allocation_get_all_by_values(**kwargs):
-            if kwargs['compute_host_id'] == 'host1':
-                return True
         self.cfg.CONF.set_override('cleaning_time', '5')
         host_get = self.patch(
             self.db_api,
@@ -2384,24 +2631,25 @@ class PhysicalHostPluginTestCase(tests.TestCase):
         ]
         host_get = self.patch(
             self.db_api,
-            'host_allocation_get_all_by_values')
-        host_get.side_effect = host_allocation_get_all_by_values
-        host_get = self.patch(
+            'host_allocation_count_by_host_ids')
+        host_get.return_value = {'host1': 1}
+        get_reserved_host_ids = self.patch(
             self.db_utils,
-            'get_free_periods')
-        host_get.return_value = [
-            (datetime.datetime(2013, 12, 19, 20, 00)
-             - datetime.timedelta(minutes=5),
-             datetime.datetime(2013, 12, 19, 21, 00)
-             + datetime.timedelta(minutes=5))
-        ]
+            'get_reserved_host_ids')
+        get_reserved_host_ids.return_value = set()
         result = self.fake_phys_plugin._matching_hosts(
-            '[]', '[]', '3-3',
+            '[]', '[]', (3, 3),
             datetime.datetime(2013, 12, 19, 20, 00),
             datetime.datetime(2013, 12, 19, 21, 00),
             None
         )
         self.assertEqual(set(['host1', 'host2', 'host3']), set(result))
+        get_reserved_host_ids.assert_called_once_with(
+            ['host1'],
+            datetime.datetime(2013, 12, 19, 20, 00)
+            - datetime.timedelta(minutes=5),
+            datetime.datetime(2013, 12, 19, 21, 00)
+            + datetime.timedelta(minutes=5))
 
     def test_matching_hosts_not_matching(self):
         host_get = self.patch(
@@ -2409,13 +2657,70 @@ class PhysicalHostPluginTestCase(tests.TestCase):
             'reservable_host_get_all_by_queries')
         host_get.return_value = []
         result = self.fake_phys_plugin._matching_hosts(
-            '["=", "$memory_mb", "2048"]', '[]', '1-1',
+            '["=", "$memory_mb", "2048"]', '[]', (1, 1),
             datetime.datetime(2013, 12, 19, 20, 00),
             datetime.datetime(2013, 12, 19, 21, 00),
             None
         )
         self.assertEqual([], result)
 
+    def test_matching_hosts_reuses_cached_host_queries(self):
+        host_get_all_by_queries = self.patch(
+            self.db_api, 'host_get_all_by_queries')
+        host_get_all_by_queries.return_value = [
+            {'id': 'host1', 'reservable': True},
+            {'id': 'host2', 'reservable': False},
+        ]
+        reservable_host_get = self.patch(
+            self.db_api, 'reservable_host_get_all_by_queries')
+        self.patch(self.db_api,
+                   'host_allocation_count_by_host_ids').return_value = {}
+
+        with self.fake_phys_plugin._cached_host_queries():
+            hosts = self.fake_phys_plugin._filter_hosts_by_properties(
+                '["=", "$memory_mb", "2048"]', '')
+            result = self.fake_phys_plugin._matching_hosts(
+                '["=", "$memory_mb", "2048"]', '', (1, 2),
+                datetime.datetime(2013, 12, 19, 20, 00),
+                datetime.datetime(2013, 12, 19, 21, 00),
+                None
+            )
+
+        self.assertEqual(['host1', 'host2'], [h['id'] for h in hosts])
+        self.assertEqual(['host1'], result)
+        host_get_all_by_queries.assert_called_once_with(
+            ['memory_mb == 2048'])
+        reservable_host_get.assert_not_called()
+        self.assertFalse(
+            hasattr(self.fake_phys_plugin._host_queries, 'cache'))
+
+    def test_host_matching_converts_properties_once(self):
+        convert_requirements = self.patch(
+            self.host_plugin.plugins_utils, 'convert_requirements')
+        convert_requirements.return_value = ['memory_mb == 2048']
+        host_get_all_by_queries = self.patch(
+            self.db_api, 'host_get_all_by_queries')
+        reservable_host_get = self.patch(
+            self.db_api, 'reservable_host_get_all_by_queries')
+        reservable_host_get.return_value = []
+        self.patch(self.db_api,
+                   'host_allocation_count_by_host_ids').return_value = {}
+
+        for _ in range(2):
+            self.fake_phys_plugin._filter_hosts_by_properties(
+                '["=", "$memory_mb", "2048"]', '')
+            self.fake_phys_plugin._matching_hosts(
+                '["=", "$memory_mb", "2048"]', '', (1, 2),
+                datetime.datetime(2013, 12, 19, 20, 00),
+                datetime.datetime(2013, 12, 19, 21, 00),
+                None
+            )
+
+        convert_requirements.assert_called_once_with(
+            '["=", "$memory_mb", "2048"]')
+        host_get_all_by_queries.assert_called_with(['memory_mb == 2048'])
+        reservable_host_get.assert_called_with(['memory_mb == 2048'])
+
     def test_check_params_with_valid_before_end(self):
         values = {
             'min': 1,
@@ -2526,6 +2831,36 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
         super(PhysicalHostMonitorPluginTestCase, self).setUp()
         self.patch(nova_client, 'Client')
         self.host_monitor_plugin = host_plugin.PhysicalHostMonitorPlugin()
+        self.host_monitor_plugin._pending_host_states = None
+        self.useFixture(conf_fixture.Config(CONF)).config(
+            notification_batch_delay=0, group=plugin.RESOURCE_TYPE)
+
+    def test_singleton_created_once_by_concurrent_threads(self):
+        monitor_plugin_cls = host_plugin.PhysicalHostMonitorPlugin
+        instances = []
+
+        def create_instance():
+            instances.append(
+                monitor_plugin_cls(**host_plugin.MONITOR_ARGS))
+
+        def slow_new(cls):
+            time.sleep(0.1)
+            return object.__new__(cls)
+
+        with mock.patch.object(monitor_plugin_cls, '_instance', None), \
+                mock.patch.object(host_plugin.monitor.base.BaseMonitorPlugin,
+                                  '__new__', create=True,
+                                  side_effect=slow_new) as new:
+            threads = [threading.Thread(target=create_instance)
+                       for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        new.assert_called_once_with(monitor_plugin_cls)
+        self.assertEqual(2, len(instances))
+        self.assertIs(instances[0], instances[1])
 
     def test_notification_callback_disabled_true(self):
         failed_host = {'hypervisor_hostname': 'hypvsr1', 'id': '1'}
@@ -2551,12 +2886,13 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
         host_get_all = self.patch(db_api,
                                   'reservable_host_get_all_by_queries')
         host_get_all.return_value = [failed_host]
-        self.patch(db_api, 'host_update')
+        self.patch(db_api, 'host_update_bulk')
 
         result = self.host_monitor_plugin.notification_callback(event_type,
                                                                 payload)
         host_get_all.assert_called_once_with(
-            ['hypervisor_hostname == ' + payload['nova_object.data']['host']])
+            [('hypervisor_hostname', 'in',
+              [payload['nova_object.data']['host']])])
         self.assertEqual({}, result)
 
     def test_notification_callback_no_failure(self):
@@ -2586,7 +2922,8 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
                                                                 payload)
         host_get_all.assert_called_once_with(
             ['reservable == 0',
-             'hypervisor_hostname == ' + payload['nova_object.data']['host']])
+             ('hypervisor_hostname', 'in',
+              [payload['nova_object.data']['host']])])
         self.assertEqual({}, result)
 
     def test_notification_callback_recover(self):
@@ -2612,17 +2949,56 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
         }
         host_get_all = self.patch(db_api, 'host_get_all_by_queries')
         host_get_all.return_value = [recovered_host]
-        host_update = self.patch(db_api, 'host_update')
+        host_update_bulk = self.patch(db_api, 'host_update_bulk')
 
         result = self.host_monitor_plugin.notification_callback(event_type,
                                                                 payload)
         host_get_all.assert_called_once_with(
             ['reservable == 0',
-             'hypervisor_hostname == ' + payload['nova_object.data']['host']])
-        host_update.assert_called_once_with(recovered_host['id'],
-                                            {'reservable': True})
+             ('hypervisor_hostname', 'in',
+              [payload['nova_object.data']['host']])])
+        host_update_bulk.assert_called_once_with([recovered_host['id']],
+                                                 {'reservable': True})
         self.assertEqual({}, result)
 
+    def test_notification_callback_batches_notifications(self):
+        self.useFixture(conf_fixture.Config(CONF)).config(
+            notification_batch_delay=0.1, group=plugin.RESOURCE_TYPE)
+        spawn_after = self.patch(host_plugin.eventlet, 'spawn_after')
+        reservable_get_all = self.patch(db_api,
+                                        'reservable_host_get_all_by_queries')
+        reservable_get_all.return_value = [
+            {'hypervisor_hostname': 'hypvsr1', 'id': '1'}]
+        host_get_all = self.patch(db_api, 'host_get_all_by_queries')
+        host_get_all.return_value = [
+            {'hypervisor_hostname': 'hypvsr2', 'id': '2'}]
+        host_update_bulk = self.patch(db_api, 'host_update_bulk')
+
+        for host, disabled in (('hypvsr1', False), ('hypvsr2', True),
+                               ('hypvsr1', True), ('hypvsr3', True),
+                               ('hypvsr2', False)):
+            payload = {'nova_object.data': {'host': host,
+                                            'disabled': disabled,
+                                            'forced_down': False}}
+            result = self.host_monitor_plugin.notification_callback(
+                'service.update', payload)
+            self.assertEqual({}, result)
+
+        spawn_after.assert_called_once_with(
+            0.1, self.host_monitor_plugin._handle_host_states)
+        reservable_get_all.assert_not_called()
+
+        self.host_monitor_plugin._handle_host_states()
+
+        reservable_get_all.assert_called_once_with(
+            [('hypervisor_hostname', 'in', ['hypvsr1', 'hypvsr3'])])
+        host_get_all.assert_called_once_with(
+            ['reservable == 0', ('hypervisor_hostname', 'in', ['hypvsr2'])])
+        host_update_bulk.assert_has_calls([
+            mock.call(['1'], {'reservable': False}),
+            mock.call(['2'], {'reservable': True})])
+        self.assertIsNone(self.host_monitor_plugin._pending_host_states)
+
     def test_poll_resource_failures_state_down(self):
         hosts = [
             {'id': '1',
@@ -2634,7 +3010,7 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
         ]
 
         host_get_all = self.patch(db_api,
-                                  'host_get_all_by_filters')
+                                  'host_get_all_for_polling')
         host_get_all.return_value = hosts
         hypervisors_list = self.patch(
             self.host_monitor_plugin.nova.hypervisors, 'list')
@@ -2656,7 +3032,7 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
         ]
 
         host_get_all = self.patch(db_api,
-                                  'host_get_all_by_filters')
+                                  'host_get_all_for_polling')
         host_get_all.return_value = hosts
         hypervisors_list = self.patch(
             self.host_monitor_plugin.nova.hypervisors, 'list')
@@ -2678,7 +3054,7 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
         ]
 
         host_get_all = self.patch(db_api,
-                                  'host_get_all_by_filters')
+                                  'host_get_all_for_polling')
         host_get_all.return_value = hosts
         hypervisors_list = self.patch(
             self.host_monitor_plugin.nova.hypervisors, 'list')
@@ -2700,7 +3076,7 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
         ]
 
         host_get_all = self.patch(db_api,
-                                  'host_get_all_by_filters')
+                                  'host_get_all_for_polling')
         host_get_all.return_value = hosts
         hypervisors_list = self.patch(
             self.host_monitor_plugin.nova.hypervisors, 'list')
@@ -2711,6 +3087,77 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
         result = self.host_monitor_plugin.poll_resource_failures()
         self.assertEqual(([], hosts), result)
 
+    def test_poll_resource_failures_mixed(self):
+        hosts = [
+            {'id': '1', 'hypervisor_hostname': 'hypvsr1',
+             'hypervisor_type': 'QEMU', 'reservable': True},
+            {'id': '2', 'hypervisor_hostname': 'hypvsr2',
+             'hypervisor_type': 'QEMU', 'reservable': False},
+            {'id': '3', 'hypervisor_hostname': 'node-3',
+             'hypervisor_type': 'ironic', 'reservable': True},
+            {'id': '4', 'hypervisor_hostname': 'node-4',
+             'hypervisor_type': 'ironic', 'reservable': False},
+            {'id': '5', 'hypervisor_hostname': 'node-5',
+             'hypervisor_type': 'ironic', 'reservable': True},
+        ]
+
+        host_get_all = self.patch(db_api,
+                                  'host_get_all_for_polling')
+        host_get_all.return_value = hosts
+        hypervisors_list = self.patch(
+            self.host_monitor_plugin.nova.hypervisors, 'list')
+        hypervisors_list.return_value = [
+            mock.MagicMock(id=1, state='down', status='enabled'),
+            mock.MagicMock(id=2, state='up', status='enabled')]
+        ironic_client = self.patch(host_plugin.ironic, 'BlazarIronicClient')
+        ironic_client.return_value.ironic.node.list.return_value = [
+            mock.MagicMock(uuid='node-3', maintenance=True,
+                           power_state='power on',
+                           provision_state='active'),
+            mock.MagicMock(uuid='node-4', maintenance=False,
+                           power_state='power off',
+                           provision_state='available'),
+            mock.MagicMock(uuid='node-5', maintenance=False,
+                           power_state='power on',
+                           provision_state='active'),
+        ]
+
+        result = self.host_monitor_plugin.poll_resource_failures()
+        self.assertEqual(([hosts[2], hosts[0]], [hosts[3], hosts[1]]),
+                         result)
+
+    def test_poll_lists_hypervisor_summaries_every_poll(self):
+        host_get_all = self.patch(db_api, 'host_get_all_for_polling')
+        host_get_all.return_value = [
+            {'id': '1', 'hypervisor_hostname': 'hypvsr1',
+             'hypervisor_type': 'QEMU', 'reservable': True}]
+        hypervisors_list = self.patch(
+            self.host_monitor_plugin.nova.hypervisors, 'list')
+        hypervisors_list.return_value = [
+            mock.MagicMock(id=1, state='up', status='enabled')]
+
+        self.host_monitor_plugin.poll_resource_failures()
+        self.host_monitor_plugin.poll_resource_failures()
+        hypervisors_list.assert_has_calls([mock.call(detailed=False)] * 2)
+
+    def test_poll_sets_reservable_in_bulk(self):
+        failed_hosts = [{'id': '1', 'hypervisor_hostname': 'hypvsr1'},
+                        {'id': '2', 'hypervisor_hostname': 'hypvsr2'}]
+        recovered_hosts = [{'id': '3', 'hypervisor_hostname': 'hypvsr3'}]
+        self.patch(self.host_monitor_plugin,
+                   'poll_resource_failures').return_value = (failed_hosts,
+                                                             recovered_hosts)
+        self.patch(self.host_monitor_plugin, 'heal').return_value = {}
+        host_update_bulk = self.patch(db_api, 'host_update_bulk')
+        host_update = self.patch(db_api, 'host_update')
+
+        self.assertEqual({}, self.host_monitor_plugin.poll())
+
+        host_update_bulk.assert_has_calls([
+            mock.call(['1', '2'], {'reservable': False}),
+            mock.call(['3'], {'reservable': True})])
+        host_update.assert_not_called()
+
     def test_heal(self):
         failed_hosts = [
             {'id': '1',
@@ -2739,6 +3186,18 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
         }
         get_reservations = self.patch(db_utils, 'get_reservations_by_host_ids')
         get_reservations.return_value = [dummy_reservation]
+        patcher = mock.patch.multiple(
+            self.host_monitor_plugin, create=True,
+            resource_type=plugin.RESOURCE_TYPE, _next_healing_interval=20,
+            _reallocate=mock.DEFAULT)
+        reallocate = patcher.start()['_reallocate']
+        self.addCleanup(patcher.stop)
+        reallocate.return_value = True
+        self.patch(db_api, 'reservation_get').return_value = (
+            dummy_reservation)
+        self.patch(db_api, 'lease_get').return_value = {'id': 'lease-1'}
+        backoff = self.patch(self.host_monitor_plugin,
+                             '_backoff_healing_interval')
 
         with mock.patch.object(datetime, 'datetime',
                                mock.Mock(wraps=datetime.datetime)) as patched:
@@ -2746,3 +3205,63 @@ class PhysicalHostMonitorPluginTestCase(tests.TestCase):
             result = self.host_monitor_plugin.heal()
 
         self.assertEqual(reservation_flags, result)
+        get_reservations.assert_called_once_with(
+            ['1'], start_date, start_date + datetime.timedelta(minutes=60))
+        reallocate.assert_called_once()
+        # Healing outside of the healing timer leaves its backoff alone
+        backoff.assert_not_called()
+        self.assertEqual(
+            20, self.host_monitor_plugin.get_next_healing_interval())
+
+    def _set_healing_backoff(self, next_interval=None):
+        patcher = mock.patch.multiple(
+            self.host_monitor_plugin, resource_type=plugin.RESOURCE_TYPE,
+            _next_healing_interval=next_interval)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.useFixture(conf_fixture.Config(CONF)).config(
+            healing_interval=10, healing_max_interval=30,
+            group=plugin.RESOURCE_TYPE)
+
+    def test_heal_periodically_backs_off_when_idle(self):
+        self._set_healing_backoff()
+        hosts_get = self.patch(db_api, 'unreservable_host_get_all_by_queries')
+        hosts_get.return_value = []
+        heal_reservations = self.patch(self.host_monitor_plugin,
+                                       'heal_reservations')
+
+        intervals = []
+        with mock.patch.object(datetime, 'datetime',
+                               mock.Mock(wraps=datetime.datetime)) as patched:
+            for _ in range(3):
+                self.assertEqual(
+                    {}, self.host_monitor_plugin.heal_periodically())
+                intervals.append(
+                    self.host_monitor_plugin.get_next_healing_interval())
+
+        self.assertEqual([20, 30, 30], intervals)
+        heal_reservations.assert_not_called()
+        patched.utcnow.assert_not_called()
+
+    def test_heal_periodically_resets_interval_when_flagged(self):
+        self._set_healing_backoff(next_interval=20)
+        failed_hosts = [{'id': '1', 'hypervisor_hostname': 'hypvsr1'}]
+        hosts_get = self.patch(db_api, 'unreservable_host_get_all_by_queries')
+        hosts_get.return_value = failed_hosts
+        heal_reservations = self.patch(self.host_monitor_plugin,
+                                       'heal_reservations')
+        heal_reservations.return_value = {
+            'rsrv-1': {'missing_resources': True}}
+        start_date = datetime.datetime(2020, 1, 1, 12, 00)
+
+        with mock.patch.object(datetime, 'datetime',
+                               mock.Mock(wraps=datetime.datetime)) as patched:
+            patched.utcnow.return_value = start_date
+            result = self.host_monitor_plugin.heal_periodically()
+
+        self.assertEqual({'rsrv-1': {'missing_resources': True}}, result)
+        heal_reservations.assert_called_once_with(
+            failed_hosts, start_date,
+            start_date + datetime.timedelta(minutes=30))
+        self.assertEqual(
+            10, self.host_monitor_plugin.get_next_healing_interval())
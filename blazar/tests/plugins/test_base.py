@@ -46,6 +46,7 @@ class BasePluginTestCase(tests.TestCase):
     def setUp(self):
         super(BasePluginTestCase, self).setUp()
         self.plugin = BasePluginDummy()
+        base._authorized_projects.cache_clear()
 
     def test__is_project_allowed(self):
         # No project restrictions
@@ -72,3 +73,17 @@ class BasePluginTestCase(tests.TestCase):
         self.assertTrue(self.plugin.is_project_allowed(project_id, resource))
         project_id = "923cf8d0-e65c-11eb-ba80-0242ac130004"
         self.assertFalse(self.plugin.is_project_allowed(project_id, resource))
+
+    def test__is_project_allowed_parses_projects_once(self):
+        resource = {
+            "authorized_projects": "0ac67a48-e65c-11eb-ba80-0242ac130004,"
+                                   "6bd9356e-e65c-11eb-ba80-0242ac130004"
+        }
+        for project_id in ("0ac67a48-e65c-11eb-ba80-0242ac130004",
+                           "923cf8d0-e65c-11eb-ba80-0242ac130004"):
+            self.plugin.is_project_allowed(project_id, resource)
+
+        cache_info = base._authorized_projects.cache_info()
+        self.assertEqual(1, cache_info.misses)
+        self.assertEqual(1, cache_info.hits)
+        self.assertEqual(["authorized_projects"], list(resource))
@@ -13,10 +13,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from oslo_config import cfg
+from oslo_config import fixture as conf_fixture
+
 from blazar.manager import exceptions
 from blazar import tests
 from blazar.utils.openstack import base
 
+CONF = cfg.CONF
+CONF.import_opt('os_region_name', 'blazar.utils.openstack.keystone')
+
 
 class TestBaseStackUtils(tests.TestCase):
 
@@ -107,3 +113,31 @@ class TestBaseStackUtils(tests.TestCase):
         self.assertRaises(exceptions.EndpointsNotFound, self.base.url_for,
                           service_catalog, self.service_type,
                           os_region_name='RegionTwo')
+
+
+class TestClientKwargs(tests.TestCase):
+
+    def setUp(self):
+        super(TestClientKwargs, self).setUp()
+        base._http_session = None
+        self.addCleanup(setattr, base, '_http_session', None)
+        self.cfg = self.useFixture(conf_fixture.Config(CONF))
+
+    def test_client_kwargs_share_http_session(self):
+        kwargs1 = base.client_kwargs(ctx=None)
+        kwargs2 = base.client_kwargs(ctx=None, trust_id='trust')
+
+        self.assertIsNot(kwargs1['session'], kwargs2['session'])
+        self.assertIsNot(kwargs1['session'].auth, kwargs2['session'].auth)
+        self.assertIs(base.get_http_session(), kwargs1['session'].session)
+        self.assertIs(base.get_http_session(), kwargs2['session'].session)
+
+    def test_get_http_session_pool_size(self):
+        self.cfg.config(os_http_pool_maxsize=8)
+
+        http_session = base.get_http_session()
+
+        for prefix in ('http://', 'https://'):
+            adapter = http_session.get_adapter(prefix + 'example.com')
+            self.assertEqual(8, adapter._pool_maxsize)
+            self.assertEqual(base.HTTP_RETRIES, adapter.max_retries.total)
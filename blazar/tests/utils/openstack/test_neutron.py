@@ -49,12 +49,24 @@ class TestBlazarNeutronClient(tests.TestCase):
                          client.neutron.httpclient.global_request_id)
 
 
+    def test_client_attributes_are_kept(self):
+        client = neutron.BlazarNeutronClient()
+
+        self.assertNotIn('list_ports', vars(client))
+        list_ports = client.list_ports
+        self.assertEqual(list_ports, vars(client)['list_ports'])
+        self.assertEqual(client.neutron.list_ports, client.list_ports)
+
 class TestFloatingIPPool(tests.TestCase):
     def setUp(self):
         super(TestFloatingIPPool, self).setUp()
         self.mock_net = self.patch(neutronclient.v2_0.client.Client,
                                    'show_network')
         self.mock_net.return_value = {'network': {'id': 'net-id'}}
+        patcher = mock.patch.object(neutron.FloatingIPPool,
+                                    '_create_with_tags', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_init_floatingippool(self):
         client = neutron.FloatingIPPool('net-id')
@@ -67,6 +79,64 @@ class TestFloatingIPPool(tests.TestCase):
         self.assertRaises(exceptions.FloatingIPNetworkNotFound,
                           neutron.FloatingIPPool, 'invalid-net-id')
 
+    def _set_subnets(self):
+        subnets = [
+            {'id': 'sub1', 'cidr': '10.0.0.0/24',
+             'gateway_ip': '10.0.0.1',
+             'allocation_pools': [{'start': '10.0.0.2',
+                                   'end': '10.0.0.254'}]},
+            {'id': 'sub2', 'cidr': '172.24.4.0/24',
+             'gateway_ip': '172.24.4.1',
+             'allocation_pools': [{'start': '172.24.4.2',
+                                   'end': '172.24.4.100'}]},
+        ]
+        mock_subnets = self.patch(neutronclient.v2_0.client.Client,
+                                  'list_subnets')
+        mock_subnets.return_value = {'subnets': subnets}
+        return mock_subnets
+
+    def test_fetch_subnet(self):
+        mock_subnets = self._set_subnets()
+
+        client = neutron.FloatingIPPool('net-id')
+        subnet = client.fetch_subnet('172.24.4.200')
+        client.fetch_subnet('172.24.4.201')
+
+        self.assertEqual('sub2', subnet['id'])
+        self.assertEqual('sub2', client.subnet_id)
+        self.mock_net.assert_called_once_with('net-id')
+        mock_subnets.assert_called_once_with(network_id='net-id')
+
+    def test_fetch_subnet_in_allocation_pool(self):
+        self._set_subnets()
+
+        client = neutron.FloatingIPPool('net-id')
+        self.assertRaises(exceptions.NeutronUsesFloatingIP,
+                          client.fetch_subnet, '172.24.4.50')
+
+    def test_fetch_subnet_gateway_ip(self):
+        self._set_subnets()
+
+        client = neutron.FloatingIPPool('net-id')
+        self.assertRaises(exceptions.NeutronUsesFloatingIP,
+                          client.fetch_subnet, '172.24.4.1')
+
+    def test_fetch_subnet_allocation_pool_bounds(self):
+        self._set_subnets()
+
+        client = neutron.FloatingIPPool('net-id')
+        for address in ('172.24.4.2', '172.24.4.100'):
+            self.assertRaises(exceptions.NeutronUsesFloatingIP,
+                              client.fetch_subnet, address)
+        self.assertEqual('sub2', client.fetch_subnet('172.24.4.101')['id'])
+
+    def test_fetch_subnet_not_found(self):
+        self._set_subnets()
+
+        client = neutron.FloatingIPPool('net-id')
+        self.assertRaises(exceptions.FloatingIPSubnetNotFound,
+                          client.fetch_subnet, '192.168.0.10')
+
     @mock.patch.object(neutronclient.v2_0.client.Client, 'create_floatingip')
     @mock.patch.object(neutronclient.v2_0.client.Client, 'replace_tag')
     def test_create_reserved_floatingip(self, mock_tag, mock_fip):
@@ -80,15 +150,56 @@ class TestFloatingIPPool(tests.TestCase):
                 'floating_network_id': 'net-id',
                 'subnet_id': 'subnet-id',
                 'floating_ip_address': '172.24.4.200',
-                'project_id': 'project-id'
+                'project_id': 'project-id',
+                'tags': ['blazar', 'reservation:reservation-id']
             }
         }
         mock_fip.assert_called_once_with(expected_body)
-        mock_tag.assert_called_once_with(
-            'floatingips',
-            'fip-id',
-            {'tags': ['blazar', 'reservation:reservation-id']}
-        )
+        mock_tag.assert_not_called()
+        self.assertTrue(neutron.FloatingIPPool._create_with_tags)
+
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'create_floatingip')
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'replace_tag')
+    def test_create_reserved_floatingip_without_tags_support(self, mock_tag,
+                                                             mock_fip):
+        mock_fip.side_effect = [
+            neutron_exceptions.BadRequest(
+                "Unrecognized attribute(s) 'tags'"),
+            {'floatingip': {'id': 'fip-id1'}},
+            {'floatingip': {'id': 'fip-id2'}},
+        ]
+
+        client = neutron.FloatingIPPool('net-id')
+        client.create_reserved_floatingip('subnet-id', '172.24.4.200',
+                                          'project-id', 'reservation-id')
+        client.create_reserved_floatingip('subnet-id', '172.24.4.201',
+                                          'project-id', 'reservation-id')
+
+        self.assertEqual(3, mock_fip.call_count)
+        self.assertIn('tags', mock_fip.call_args_list[0][0][0]['floatingip'])
+        for call in mock_fip.call_args_list[1:]:
+            self.assertNotIn('tags', call[0][0]['floatingip'])
+        tags = {'tags': ['blazar', 'reservation:reservation-id']}
+        mock_tag.assert_has_calls([
+            mock.call('floatingips', 'fip-id1', tags),
+            mock.call('floatingips', 'fip-id2', tags)])
+        self.assertFalse(neutron.FloatingIPPool._create_with_tags)
+
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'create_floatingip')
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'replace_tag')
+    def test_create_reserved_floatingip_bad_request(self, mock_tag,
+                                                    mock_fip):
+        mock_fip.side_effect = neutron_exceptions.BadRequest(
+            'Invalid input for floating_ip_address')
+
+        client = neutron.FloatingIPPool('net-id')
+        self.assertRaises(neutron_exceptions.BadRequest,
+                          client.create_reserved_floatingip,
+                          'subnet-id', '172.24.4.200',
+                          'project-id', 'reservation-id')
+        mock_fip.assert_called_once()
+        mock_tag.assert_not_called()
+        self.assertIsNone(neutron.FloatingIPPool._create_with_tags)
 
     @mock.patch.object(neutronclient.v2_0.client.Client, 'list_floatingips')
     @mock.patch.object(neutronclient.v2_0.client.Client, 'update_floatingip')
@@ -151,3 +262,75 @@ class TestFloatingIPPool(tests.TestCase):
         mock_list.assert_called_once_with(**query)
         mock_update.assert_not_called()
         mock_delete.assert_called_once_with('fip-id')
+
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'list_floatingips')
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'update_floatingip')
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'delete_floatingip')
+    def test_delete_reserved_floatingips(self, mock_delete,
+                                         mock_update, mock_list):
+        mock_list.return_value = {
+            'floatingips': [
+                {'port_id': 'port-id', 'id': 'fip-id1'},
+                {'port_id': None, 'id': 'fip-id2'},
+            ]}
+
+        client = neutron.FloatingIPPool('net-id')
+        client.delete_reserved_floatingips(
+            ['172.24.4.200', '172.24.4.201', '172.24.4.202'])
+
+        mock_list.assert_called_once_with(
+            floating_ip_address=['172.24.4.200', '172.24.4.201',
+                                 '172.24.4.202'],
+            floating_network_id='net-id')
+        mock_update.assert_called_once_with('fip-id1',
+                                            {'floatingip': {'port_id': None}})
+        mock_delete.assert_has_calls([mock.call('fip-id1'),
+                                      mock.call('fip-id2')], any_order=True)
+        self.assertEqual(2, mock_delete.call_count)
+
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'list_floatingips')
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'delete_floatingip')
+    def test_delete_reserved_floatingips_failure(self, mock_delete,
+                                                 mock_list):
+        mock_list.return_value = {
+            'floatingips': [
+                {'port_id': None, 'id': 'fip-id1'},
+                {'port_id': None, 'id': 'fip-id2'},
+            ]}
+
+        def fake_delete(fip_id):
+            if fip_id == 'fip-id1':
+                raise neutron_exceptions.Conflict()
+
+        mock_delete.side_effect = fake_delete
+
+        client = neutron.FloatingIPPool('net-id')
+        self.assertRaises(neutron_exceptions.Conflict,
+                          client.delete_reserved_floatingips,
+                          ['172.24.4.200', '172.24.4.201'])
+        self.assertEqual(2, mock_delete.call_count)
+
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'list_floatingips')
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'delete_floatingip')
+    def test_delete_reserved_floatingips_concurrency(self, mock_delete,
+                                                     mock_list):
+        self.useFixture(fixture.Config(CONF)).config(
+            floatingip_delete_concurrency=4, group='neutron')
+        mock_list.return_value = {
+            'floatingips': [{'port_id': None, 'id': 'fip-id1'}]}
+        green_pool = self.patch(neutron.eventlet, 'GreenPool')
+        green_pool.return_value.spawn.side_effect = (
+            lambda func, *args: mock.Mock(wait=lambda: func(*args)))
+
+        client = neutron.FloatingIPPool('net-id')
+        client.delete_reserved_floatingips(['172.24.4.200'])
+
+        green_pool.assert_called_once_with(4)
+        mock_delete.assert_called_once_with('fip-id1')
+
+    @mock.patch.object(neutronclient.v2_0.client.Client, 'list_floatingips')
+    def test_delete_reserved_floatingips_no_addresses(self, mock_list):
+        client = neutron.FloatingIPPool('net-id')
+        client.delete_reserved_floatingips([])
+
+        mock_list.assert_not_called()
@@ -15,6 +15,7 @@
 from unittest import mock
 import uuid as uuidgen
 
+import eventlet
 from keystoneauth1 import session
 from keystoneauth1 import token_endpoint
 from novaclient import client as nova_client
@@ -23,6 +24,7 @@ from novaclient.v2 import availability_zones
 from novaclient.v2 import hypervisors
 from oslo_config import cfg
 from oslo_config import fixture
+from oslo_serialization import jsonutils
 
 from blazar import context
 from blazar.manager import exceptions as manager_exceptions
@@ -55,6 +57,21 @@ class TestCNClient(tests.TestCase):
         # TODO(n.s.): Will be done as soon as pypi package will be updated
         pass
 
+    def test_wrapper_reuses_client_within_request(self):
+        blazar_nova_client = self.patch(self.nova, 'BlazarNovaClient')
+        blazar_nova_client.side_effect = lambda **kwargs: mock.Mock()
+        wrapper = self.nova.NovaClientWrapper()
+
+        self.ctx.return_value.global_request_id = 'req-1'
+        client = wrapper.nova
+        self.assertIs(client, wrapper.nova)
+
+        self.ctx.return_value.global_request_id = 'req-2'
+        self.assertIsNot(client, wrapper.nova)
+        self.assertEqual(2, blazar_nova_client.call_count)
+        blazar_nova_client.assert_called_with(
+            endpoint_override=CONF.nova.endpoint_override)
+
 
 class AggregateFake(object):
 
@@ -108,6 +125,9 @@ class ReservationPoolTestCase(tests.TestCase):
         self.p_name = self.patch(self.pool, '_generate_aggregate_name')
         self.p_name.return_value = self.pool_name
 
+        nova.ReservationPool._aggregate_ids_cache.clear()
+        self.addCleanup(nova.ReservationPool._aggregate_ids_cache.clear)
+
     def _patch_get_aggregate_from_name_or_id(self):
         def get_fake_aggregate(*args):
             if self.freepool_name in args or self.fake_freepool.id in args:
@@ -117,6 +137,52 @@ class ReservationPoolTestCase(tests.TestCase):
 
         patched_pool = self.patch(self.pool, 'get_aggregate_from_name_or_id')
         patched_pool.side_effect = get_fake_aggregate
+        self._patch_get_aggregates(get_fake_aggregate)
+
+    def _patch_get_aggregates(self, get_fake_aggregate):
+        patched_aggregates = self.patch(self.pool, '_get_aggregates')
+        patched_aggregates.side_effect = lambda *args: [
+            get_fake_aggregate(arg) for arg in args]
+
+    def _patch_get_aggregates_but_no_freepool(self):
+        self._patch_get_aggregates(
+            lambda arg: None if arg == self.freepool_name
+            else self.fake_aggregate)
+
+    def _patch_get_no_aggregate_but_freepool(self):
+        self._patch_get_aggregates(
+            lambda arg: self.fake_freepool if arg == self.freepool_name
+            else None)
+
+    def test_get_aggregates(self):
+        self.nova.aggregates.list.return_value = [self.fake_aggregate,
+                                                  self.fake_freepool]
+
+        self.assertEqual(
+            [self.fake_aggregate, self.fake_freepool, None, None,
+             self.fake_aggregate],
+            self.pool._get_aggregates(str(self.fake_aggregate.id),
+                                      self.freepool_name, 'none', 3000,
+                                      self.fake_aggregate))
+        self.nova.aggregates.list.assert_called_once_with()
+        self.nova.aggregates.get.assert_not_called()
+
+    def test_add_computehost_lists_aggregates_once(self):
+        self.nova.aggregates.list.return_value = [self.fake_aggregate,
+                                                  self.fake_freepool]
+        self.fake_freepool.hosts = ['host3', 'host4']
+        self.nova.servers.list.return_value = []
+
+        agg = self.pool.add_computehost(self.fake_aggregate.id,
+                                        ['host3', 'host4'])
+
+        self.assertEqual(self.fake_aggregate, agg)
+        self.assertEqual(['host1', 'host2', 'host3', 'host4'], agg.hosts)
+        self.nova.aggregates.list.assert_called_once_with()
+        self.nova.aggregates.get.assert_not_called()
+        self.nova.aggregates.remove_host.assert_has_calls([
+            mock.call(self.fake_freepool.id, 'host3'),
+            mock.call(self.fake_freepool.id, 'host4')])
 
     def test_get_aggregate_from_name_or_id(self):
         def fake_aggregate_get(id):
@@ -138,6 +204,41 @@ class ReservationPoolTestCase(tests.TestCase):
             self.pool.get_aggregate_from_name_or_id(self.fake_aggregate),
             self.fake_aggregate)
 
+    def test_get_aggregate_from_name_or_id_caches_ids(self):
+        self.nova.aggregates.list.return_value = [self.fake_aggregate,
+                                                  self.fake_freepool]
+        self.nova.aggregates.get.return_value = self.fake_freepool
+
+        for _ in range(2):
+            self.assertEqual(
+                self.fake_freepool,
+                self.pool.get_aggregate_from_name_or_id(self.freepool_name))
+        self.nova.aggregates.list.assert_called_once_with()
+        self.nova.aggregates.get.assert_called_once_with(
+            self.fake_freepool.id)
+
+    def test_get_aggregate_from_name_or_id_renamed(self):
+        renamed = AggregateFake(i=self.fake_freepool.id, name='renamed',
+                                hosts=[])
+        self.nova.aggregates.list.return_value = [self.fake_freepool]
+        self.pool.get_aggregate_from_name_or_id(self.freepool_name)
+
+        self.nova.aggregates.get.return_value = renamed
+        self.nova.aggregates.list.return_value = [renamed]
+        self.assertRaises(manager_exceptions.AggregateNotFound,
+                          self.pool.get_aggregate_from_name_or_id,
+                          self.freepool_name)
+        self.assertEqual(2, self.nova.aggregates.list.call_count)
+
+    def test_get_aggregate_from_name_or_id_without_cache(self):
+        self.cfg.config(group='nova', cache_ttl=0)
+        self.nova.aggregates.list.return_value = [self.fake_freepool]
+
+        for _ in range(2):
+            self.pool.get_aggregate_from_name_or_id(self.freepool_name)
+        self.assertEqual(2, self.nova.aggregates.list.call_count)
+        self.nova.aggregates.get.assert_not_called()
+
     def test_generate_aggregate_name(self):
         self.uuidgen = uuidgen
         self.patch(uuidgen, 'uuid4').return_value = 'foo'
@@ -216,6 +317,7 @@ class ReservationPoolTestCase(tests.TestCase):
                 return self.fake_aggregate
         fake_pool = self.patch(self.pool, 'get_aggregate_from_name_or_id')
         fake_pool.side_effect = get_fake_aggregate_but_no_freepool
+        self._patch_get_aggregates_but_no_freepool()
         agg = self.pool.get('foo')
         agg.hosts = []
         self.assertRaises(manager_exceptions.NoFreePool,
@@ -240,6 +342,18 @@ class ReservationPoolTestCase(tests.TestCase):
         check0.assert_any_call(self.fake_aggregate.id, 'host3')
         check1 = self.nova.aggregates.remove_host
         check1.assert_any_call(self.fake_freepool.id, 'host3')
+        self.nova.servers.list.assert_called_once_with(
+            detailed=False, search_opts={'node': 'host3', 'all_tenants': 1})
+
+    def test_add_computehost_with_repeated_host(self):
+        self._patch_get_aggregate_from_name_or_id()
+        self.patch(self.nova, "servers")
+        self.pool.add_computehost('pool', ['host3', 'host3'])
+
+        self.nova.aggregates.add_host.assert_called_once_with(
+            self.fake_aggregate.id, 'host3')
+        self.nova.aggregates.remove_host.assert_called_once_with(
+            self.fake_freepool.id, 'host3')
 
     def test_add_computehost_with_host_id(self):
         # NOTE(sbauza): Freepool.hosts only contains names of hosts, not UUIDs
@@ -247,6 +361,33 @@ class ReservationPoolTestCase(tests.TestCase):
         self.assertRaises(manager_exceptions.HostNotInFreePool,
                           self.pool.add_computehost, 'pool', '3')
 
+    def test_run_per_host(self):
+        action = mock.MagicMock(side_effect=[None, ValueError('host2'),
+                                             KeyError('host3')])
+
+        self.assertRaisesRegex(ValueError, 'host2', self.pool._run_per_host,
+                               action, ['host1', 'host2', 'host3'])
+        action.assert_has_calls([mock.call('host1'), mock.call('host2'),
+                                 mock.call('host3')])
+
+    def test_add_remove_computehost_resolve_client_in_caller(self):
+        self._patch_get_aggregate_from_name_or_id()
+        self.fake_freepool.hosts = ['host3', 'host4']
+        self.nova.servers.list.return_value = []
+        client = self.pool.nova
+        callers = []
+
+        def get_client(pool):
+            callers.append(eventlet.getcurrent())
+            return client
+
+        with mock.patch.object(nova.ReservationPool, 'nova',
+                               property(get_client)):
+            self.pool.add_computehost('pool', ['host3', 'host4'])
+            self.pool.remove_computehost('pool', ['host3', 'host4'])
+
+        self.assertEqual([eventlet.getcurrent()] * 2, callers)
+
     def test_add_computehost_not_in_freepool(self):
         self._patch_get_aggregate_from_name_or_id()
         self.assertRaises(manager_exceptions.HostNotInFreePool,
@@ -263,6 +404,7 @@ class ReservationPoolTestCase(tests.TestCase):
 
         fake_pool = self.patch(self.pool, 'get_aggregate_from_name_or_id')
         fake_pool.side_effect = get_fake_aggregate_but_no_freepool
+        self._patch_get_aggregates_but_no_freepool()
 
         self.assertRaises(manager_exceptions.NoFreePool,
                           self.pool.add_computehost,
@@ -277,6 +419,7 @@ class ReservationPoolTestCase(tests.TestCase):
                 raise manager_exceptions.AggregateNotFound
         fake_pool = self.patch(self.pool, 'get_aggregate_from_name_or_id')
         fake_pool.side_effect = get_no_aggregate_but_freepool
+        self._patch_get_no_aggregate_but_freepool()
         self.assertRaises(manager_exceptions.AggregateNotFound,
                           self.pool.add_computehost,
                           'wrong_pool',
@@ -288,23 +431,43 @@ class ReservationPoolTestCase(tests.TestCase):
         check = self.nova.aggregates.add_host
         check.assert_called_once_with(self.fake_freepool.id, 'host2')
 
-    def test_add_computehost_revert(self):
+    def test_add_computehost_not_in_freepool(self):
         self._patch_get_aggregate_from_name_or_id()
         self.fake_freepool.hosts = ['host1', 'host2']
         self.assertRaises(manager_exceptions.HostNotInFreePool,
                           self.pool.add_computehost,
                           'pool', ['host1', 'host2', 'host3'])
 
+        self.nova.aggregates.add_host.assert_not_called()
+        self.nova.aggregates.remove_host.assert_not_called()
+
+    def test_add_computehost_revert(self):
+        self._patch_get_aggregate_from_name_or_id()
+        self.fake_freepool.hosts = ['host1', 'host2', 'host3']
+        self.nova.servers.list.return_value = []
+
+        def fake_add_host(agg_id, host):
+            if agg_id == self.fake_aggregate.id and host == 'host2':
+                raise nova_exceptions.Conflict(409)
+
+        self.nova.aggregates.add_host.side_effect = fake_add_host
+        self.assertRaises(manager_exceptions.AggregateAlreadyHasHost,
+                          self.pool.add_computehost,
+                          'pool', ['host1', 'host2', 'host3'])
+
         check0 = self.nova.aggregates.add_host
-        check0.assert_has_calls([mock.call(self.fake_aggregate.id, 'host1'),
-                                 mock.call(self.fake_aggregate.id, 'host2'),
-                                 mock.call(self.fake_freepool.id, 'host1'),
-                                 mock.call(self.fake_freepool.id, 'host2')])
+        check0.assert_has_calls([mock.call(self.fake_freepool.id, 'host1'),
+                                 mock.call(self.fake_freepool.id, 'host2'),
+                                 mock.call(self.fake_freepool.id, 'host3')],
+                                any_order=True)
         check1 = self.nova.aggregates.remove_host
         check1.assert_has_calls([mock.call(self.fake_freepool.id, 'host1'),
                                  mock.call(self.fake_freepool.id, 'host2'),
+                                 mock.call(self.fake_freepool.id, 'host3'),
                                  mock.call(self.fake_aggregate.id, 'host1'),
-                                 mock.call(self.fake_aggregate.id, 'host2')])
+                                 mock.call(self.fake_aggregate.id, 'host3')],
+                                any_order=True)
+        self.assertEqual(5, check1.call_count)
 
     def test_remove_computehost_from_freepool(self):
         self._patch_get_aggregate_from_name_or_id()
@@ -313,6 +476,13 @@ class ReservationPoolTestCase(tests.TestCase):
         check = self.nova.aggregates.remove_host
         check.assert_called_once_with(self.fake_freepool.id, 'host3')
 
+    def test_remove_computehost_with_repeated_host(self):
+        self._patch_get_aggregate_from_name_or_id()
+        self.pool.remove_computehost(self.freepool_name, ['host3', 'host3'])
+
+        check = self.nova.aggregates.remove_host
+        check.assert_called_once_with(self.fake_freepool.id, 'host3')
+
     def test_remove_computehost_not_existing_from_freepool(self):
         self._patch_get_aggregate_from_name_or_id()
         self.assertRaises(manager_exceptions.HostNotInFreePool,
@@ -336,6 +506,7 @@ class ReservationPoolTestCase(tests.TestCase):
 
         fake_pool = self.patch(self.pool, 'get_aggregate_from_name_or_id')
         fake_pool.side_effect = get_fake_aggregate_but_no_freepool
+        self._patch_get_aggregates_but_no_freepool()
 
         self.assertRaises(manager_exceptions.NoFreePool,
                           self.pool.remove_computehost,
@@ -350,6 +521,7 @@ class ReservationPoolTestCase(tests.TestCase):
                 raise manager_exceptions.AggregateNotFound
         fake_pool = self.patch(self.pool, 'get_aggregate_from_name_or_id')
         fake_pool.side_effect = get_no_aggregate_but_freepool
+        self._patch_get_no_aggregate_but_freepool()
         self.assertRaises(manager_exceptions.AggregateNotFound,
                           self.pool.remove_computehost,
                           'wrong_pool',
@@ -422,7 +594,9 @@ class FakeNovaHypervisors(object):
             raise nova_exceptions.NotFound(404)
 
     @classmethod
-    def search(cls, host, servers=False):
+    def search(cls, host, servers=False, detailed=False):
+        if detailed:
+            raise nova_exceptions.UnsupportedVersion()
         if host == 'multiple':
             return [cls.FakeHost, cls.FakeHost]
         if host == cls.FakeHost.service['host']:
@@ -485,6 +659,9 @@ class NovaInventoryTestCase(tests.TestCase):
         self.availability_zones = self.patch(
             availability_zones.AvailabilityZoneManager, 'list')
         self.availability_zones.side_effect = FakeAvailabilityZones.list
+        az_cache = self.nova.NovaInventory._availability_zones_cache
+        az_cache.clear()
+        self.addCleanup(az_cache.clear)
 
     def test_get_host_details_with_host_id(self):
         host = self.inventory.get_host_details('1')
@@ -496,6 +673,27 @@ class NovaInventoryTestCase(tests.TestCase):
         expected = FakeNovaHypervisors.expected()
         self.assertEqual(expected, host)
 
+    def test_get_host_details_with_host_name_detailed_search(self):
+        self.hypervisors_search.side_effect = None
+        self.hypervisors_search.return_value = [FakeNovaHypervisors.FakeHost]
+        host = self.inventory.get_host_details('fake_name')
+        expected = FakeNovaHypervisors.expected()
+        self.assertEqual(expected, host)
+        self.hypervisors_search.assert_called_once_with('fake_name',
+                                                        detailed=True)
+        self.hypervisors_get.assert_called_once_with('fake_name')
+
+    def test_get_host_details_with_host_name_old_novaclient(self):
+        def search(host, servers=False):
+            return FakeNovaHypervisors.search(host, servers=servers)
+
+        self.hypervisors_search.side_effect = search
+        host = self.inventory.get_host_details('fake_name')
+        self.assertEqual(FakeNovaHypervisors.expected(), host)
+        self.hypervisors_search.assert_called_with('fake_name')
+        self.hypervisors_get.assert_called_with(
+            FakeNovaHypervisors.FakeHost.id)
+
     def test_get_host_details_with_host_name_having_multiple_results(self):
         self.assertRaises(manager_exceptions.MultipleHostsFound,
                           self.inventory.get_host_details, 'multiple')
@@ -508,6 +706,13 @@ class NovaInventoryTestCase(tests.TestCase):
         self.assertRaises(manager_exceptions.HostNotFound,
                           self.inventory.get_host_details, 'wrong_name')
 
+    def test_get_host_details_with_cpu_info_object(self):
+        cpu_info = {'vendor': 'Intel', 'model': 'qemu32'}
+        with mock.patch.object(FakeNovaHypervisors.FakeHost, 'cpu_info',
+                               cpu_info):
+            host = self.inventory.get_host_details('1')
+        self.assertEqual(cpu_info, jsonutils.loads(host['cpu_info']))
+
     def test_get_host_details_with_invalid_host(self):
         # Create a new class from FakeHost called `invalid_host`,
         # which lacks the vcpus attribute.
@@ -527,6 +732,38 @@ class NovaInventoryTestCase(tests.TestCase):
         expected['availability_zone'] = ''
         self.assertEqual(expected, host)
 
+    def test_get_host_details_caches_availability_zones(self):
+        self.useFixture(fixture.Config(CONF)).config(group='nova',
+                                                     az_aware=True)
+        monotonic = self.patch(nova.time, 'monotonic')
+        monotonic.return_value = 100.0
+        self.inventory.get_host_details('1')
+        self.inventory.get_host_details('fake_name')
+        self.assertEqual(1, self.availability_zones.call_count)
+
+        monotonic.return_value = 100.0 + CONF.nova.cache_ttl
+        host = self.inventory.get_host_details('1')
+        self.assertEqual(2, self.availability_zones.call_count)
+        self.assertEqual(FakeNovaHypervisors.expected(), host)
+
+    def test_get_host_details_with_host_in_no_az(self):
+        self.useFixture(fixture.Config(CONF)).config(group='nova',
+                                                     az_aware=True)
+        empty_az = mock.Mock(zoneName='empty', hosts=None)
+        self.availability_zones.side_effect = None
+        self.availability_zones.return_value = [
+            empty_az, FakeAvailabilityZones.FakeAZ2]
+        host = self.inventory.get_host_details('1')
+        self.assertEqual('', host['availability_zone'])
+
+    def test_get_host_details_without_cache(self):
+        self.useFixture(fixture.Config(CONF)).config(group='nova',
+                                                     az_aware=True,
+                                                     cache_ttl=0)
+        self.inventory.get_host_details('1')
+        self.inventory.get_host_details('fake_name')
+        self.assertEqual(2, self.availability_zones.call_count)
+
     def test_get_servers_per_host(self):
         servers = self.inventory.get_servers_per_host('fake_name')
         self.assertEqual(FakeNovaHypervisors.FakeHost.servers, servers)
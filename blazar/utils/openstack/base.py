@@ -20,12 +20,40 @@ from keystoneauth1 import session
 from keystoneclient import client as keystone_client
 import netaddr
 from oslo_config import cfg
+import requests
 
 from blazar import context
 from blazar.manager import exceptions
 
 CONF = cfg.CONF
 
+# Retries on connection errors; read errors are only retried for idempotent
+# requests.
+HTTP_RETRIES = 3
+
+_http_session = None
+
+
+def get_http_session():
+    """Return the requests session shared by all OpenStack clients.
+
+    Keystoneauth sessions are created per client because their auth plugin
+    differs, but they all use this session as transport so that TCP and TLS
+    connections to the services are reused.
+    """
+    global _http_session
+    if _http_session is None:
+        adapter = session.TCPKeepAliveAdapter(
+            pool_connections=CONF.os_http_pool_maxsize,
+            pool_maxsize=CONF.os_http_pool_maxsize,
+            pool_block=False,
+            max_retries=HTTP_RETRIES)
+        http_session = requests.Session()
+        http_session.mount('https://', adapter)
+        http_session.mount('http://', adapter)
+        _http_session = http_session
+    return _http_session
+
 
 def get_os_auth_host(conf):
     """Description
@@ -38,6 +66,14 @@ def get_os_auth_host(conf):
     return os_auth_host
 
 
+def current_global_request_id():
+    """Return the global request id of the current context, if any."""
+    try:
+        return context.current().global_request_id
+    except RuntimeError:
+        return None
+
+
 def client_kwargs(**_kwargs):
     kwargs = _kwargs.copy()
 
@@ -84,7 +120,7 @@ def client_kwargs(**_kwargs):
         auth_kwargs.update(project_name=project_name)
 
     auth = v3.Password(**auth_kwargs)
-    sess = session.Session(auth=auth)
+    sess = session.Session(auth=auth, session=get_http_session())
 
     kwargs.setdefault('session', sess)
     kwargs.setdefault('region_name', region_name)
@@ -116,7 +152,7 @@ def client_user_kwargs(**_kwargs):
     data = admin_ks_client.tokens.get_token_data(ctx.auth_token)
     access_info = create_access_info(body=data, auth_token=ctx.auth_token)
     auth = access.AccessInfoPlugin(access_info, auth_url=auth_url)
-    sess = session.Session(auth=auth)
+    sess = session.Session(auth=auth, session=get_http_session())
 
     kwargs.setdefault('session', sess)
     kwargs.setdefault('region_name', region_name)
@@ -44,4 +44,8 @@ class BlazarIronicClient(object):
             CONF.ironic.ironic_api_version, **client_kwargs)
 
     def __getattr__(self, attr):
-        return getattr(self.ironic, attr)
+        # Keep the attribute on the wrapper so that later lookups of it do
+        # not go through __getattr__ again
+        value = getattr(self.ironic, attr)
+        setattr(self, attr, value)
+        return value
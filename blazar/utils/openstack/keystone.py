@@ -60,5 +60,8 @@ class BlazarKeystoneClient(object):
         self.exceptions = keystone_exception
 
     def __getattr__(self, name):
+        # Keep the attribute on the wrapper so that later lookups of it do
+        # not go through __getattr__ again
         func = getattr(self.keystone, name)
+        setattr(self, name, func)
         return func
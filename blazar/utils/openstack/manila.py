@@ -48,4 +48,8 @@ class BlazarManilaClient(object):
             CONF.manila.manila_api_version, **client_kwargs)
 
     def __getattr__(self, attr):
-        return getattr(self.manila, attr)
+        # Keep the attribute on the wrapper so that later lookups of it do
+        # not go through __getattr__ again
+        value = getattr(self.manila, attr)
+        setattr(self, attr, value)
+        return value
@@ -13,15 +13,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import eventlet
 import netaddr
 from neutronclient.common import exceptions as neutron_exceptions
 from neutronclient.v2_0 import client as neutron_client
-
+from oslo_config import cfg
 from oslo_log import log as logging
 
 from blazar.utils.openstack import base
 from blazar.utils.openstack import exceptions
 
+neutron_opts = [
+    cfg.IntOpt('floatingip_delete_concurrency',
+               default=16,
+               min=1,
+               help='Maximum number of floating IPs deleted concurrently '
+                    'when a floating IP reservation is released.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(neutron_opts, group='neutron')
 LOG = logging.getLogger(__name__)
 
 
@@ -33,11 +44,19 @@ class BlazarNeutronClient(object):
         self.neutron = neutron_client.Client(**client_kwargs)
 
     def __getattr__(self, attr):
-        return getattr(self.neutron, attr)
+        # Keep the attribute on the wrapper so that later lookups of it do
+        # not go through __getattr__ again
+        value = getattr(self.neutron, attr)
+        setattr(self, attr, value)
+        return value
 
 
 class FloatingIPPool(BlazarNeutronClient):
 
+    # Whether Neutron accepts tags in floating IP creation requests. None
+    # until the first creation tells.
+    _create_with_tags = None
+
     def __init__(self, network_id, **kwargs):
         super(FloatingIPPool, self).__init__(**kwargs)
 
@@ -48,27 +67,30 @@ class FloatingIPPool(BlazarNeutronClient):
             raise exceptions.FloatingIPNetworkNotFound(network=network_id)
 
         self.network_id = network_id
+        self._subnets = None
+
+    def _list_subnets(self):
+        if self._subnets is None:
+            self._subnets = self.neutron.list_subnets(
+                network_id=self.network_id)['subnets']
+        return self._subnets
 
     def fetch_subnet(self, floatingip):
         fip = netaddr.IPAddress(floatingip)
-        network = self.neutron.show_network(self.network_id)['network']
-        subnet_ids = network['subnets']
 
-        for sub_id in subnet_ids:
-            subnet = self.neutron.show_subnet(sub_id)['subnet']
+        for subnet in self._list_subnets():
             cidr = netaddr.IPNetwork(subnet['cidr'])
 
             # skip the subnet because it has not valid cidr for the floating ip
             if fip not in cidr:
                 continue
 
-            allocated_ip = netaddr.IPSet()
+            allocated = fip == netaddr.IPAddress(subnet['gateway_ip']) or any(
+                netaddr.IPAddress(alloc['start']) <= fip <=
+                netaddr.IPAddress(alloc['end'])
+                for alloc in subnet['allocation_pools'])
 
-            allocated_ip.add(netaddr.IPAddress(subnet['gateway_ip']))
-            for alloc in subnet['allocation_pools']:
-                allocated_ip.add(netaddr.IPRange(alloc['start'], alloc['end']))
-
-            if fip in allocated_ip:
+            if allocated:
                 raise exceptions.NeutronUsesFloatingIP(floatingip=fip,
                                                        subnet=subnet['id'])
             else:
@@ -79,6 +101,7 @@ class FloatingIPPool(BlazarNeutronClient):
 
     def create_reserved_floatingip(self, subnet_id, address, project_id,
                                    reservation_id):
+        tags = ['blazar', 'reservation:%s' % reservation_id]
         body = {
             'floatingip': {
                 'floating_network_id': self.network_id,
@@ -87,9 +110,23 @@ class FloatingIPPool(BlazarNeutronClient):
                 'project_id': project_id
             }
         }
+        if FloatingIPPool._create_with_tags is not False:
+            try:
+                self.neutron.create_floatingip(
+                    {'floatingip': dict(body['floatingip'], tags=tags)})
+                FloatingIPPool._create_with_tags = True
+                return
+            except neutron_exceptions.BadRequest as e:
+                if (FloatingIPPool._create_with_tags
+                        or 'tags' not in str(e)):
+                    raise
+                LOG.info('Neutron does not accept tags when creating '
+                         'floating IPs, they are added afterwards.')
+                FloatingIPPool._create_with_tags = False
+
         fip = self.neutron.create_floatingip(body)['floatingip']
         body = {
-            'tags': ['blazar', 'reservation:%s' % reservation_id]
+            'tags': tags
         }
         self.neutron.replace_tag('floatingips', fip['id'], body)
 
@@ -103,7 +140,29 @@ class FloatingIPPool(BlazarNeutronClient):
             # The floating ip address already deleted by the user.
             return None
 
-        fip = next(iter(fips))
+        self._delete_floatingip(next(iter(fips)))
+
+    def delete_reserved_floatingips(self, addresses):
+        """Delete the floating IPs with the given addresses.
+
+        The floating IPs are listed with a single request and deleted
+        concurrently. Addresses already deleted by the user are ignored.
+        """
+        if not addresses:
+            return
+        query = {
+            'floating_ip_address': list(addresses),
+            'floating_network_id': self.network_id
+        }
+        fips = self.neutron.list_floatingips(**query)['floatingips']
+
+        pool = eventlet.GreenPool(CONF.neutron.floatingip_delete_concurrency)
+        threads = [pool.spawn(self._delete_floatingip, fip) for fip in fips]
+        pool.waitall()
+        for thread in threads:
+            thread.wait()
+
+    def _delete_floatingip(self, fip):
         if fip['port_id']:
             # Deassociate the floating ip from the attached port because
             # the delete floatingip API deletes both the floating ip and
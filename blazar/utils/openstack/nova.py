@@ -12,13 +12,16 @@
 # implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import time
 import uuid as uuidgen
 
+import eventlet
 from novaclient import client as nova_client
 from novaclient import exceptions as nova_exception
 from novaclient.v2 import servers
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 
 from blazar.manager import exceptions as manager_exceptions
 from blazar.plugins import oshosts
@@ -55,7 +58,18 @@ nova_opts = [
                 default=True,
                 help='A flag to store original availability zone'),
     cfg.StrOpt('endpoint_override',
-               help='Nova endpoint URL to use')
+               help='Nova endpoint URL to use'),
+    cfg.IntOpt('cache_ttl',
+               default=10,
+               min=0,
+               help='Number of seconds the availability zones of the Nova '
+                    'hosts and the ids of the Nova aggregates by name are '
+                    'reused for lookups. Set to 0 to disable caching.'),
+    cfg.IntOpt('aggregate_host_concurrency',
+               default=16,
+               min=1,
+               help='Maximum number of hosts handled concurrently when '
+                    'hosts are moved between aggregates.')
 ]
 
 
@@ -74,7 +88,11 @@ class BlazarNovaClient(object):
         self.exceptions = nova_exception
 
     def __getattr__(self, name):
-        return getattr(self.nova, name)
+        # Keep the attribute on the wrapper so that later lookups of it do
+        # not go through __getattr__ again
+        value = getattr(self.nova, name)
+        setattr(self, name, value)
+        return value
 
 
 class ServerManager(servers.ServerManager):
@@ -89,29 +107,74 @@ class ServerManager(servers.ServerManager):
 
 
 class NovaClientWrapper(object):
+    # ((endpoint override, global request id), client) of the last client
+    _nova_client = None
+
     @property
     def nova(self):
-        nova = BlazarNovaClient(endpoint_override=CONF.nova.endpoint_override)
-        return nova
+        # The client is reused within a request, it is built again when the
+        # request, and so the global request id it passes on, changes
+        key = (CONF.nova.endpoint_override, base.current_global_request_id())
+        if self._nova_client is None or self._nova_client[0] != key:
+            self._nova_client = (
+                key, BlazarNovaClient(endpoint_override=key[0]))
+        return self._nova_client[1]
 
 
 class ReservationPool(NovaClientWrapper):
+
+    # Aggregate ids by name, from the last listing of each Nova endpoint,
+    # with the time at which they expire.
+    _aggregate_ids_cache = {}
+
     def __init__(self):
         super(ReservationPool, self).__init__()
         self.config = CONF.nova
         self.freepool_name = self.config.aggregate_freepool_name
 
-    def get_aggregate_from_name_or_id(self, aggregate_obj):
-        """Return an aggregate by name or an id."""
-
-        aggregate = None
-        agg_id = None
+    @staticmethod
+    def _get_aggregate_id(aggregate_obj):
+        """Return the id of an aggregate id or object, None for a name."""
         try:
-            agg_id = int(aggregate_obj)
+            return int(aggregate_obj)
         except (ValueError, TypeError):
             if hasattr(aggregate_obj, 'id') and aggregate_obj.id:
                 # pool is an aggregate
-                agg_id = aggregate_obj.id
+                return aggregate_obj.id
+        return None
+
+    def _list_aggregates(self):
+        """List all aggregates and remember their ids by name."""
+        all_aggregates = self.nova.aggregates.list()
+        ttl = CONF.nova.cache_ttl
+        if ttl:
+            self._aggregate_ids_cache[CONF.nova.endpoint_override] = (
+                time.monotonic() + ttl,
+                {agg.name: agg.id for agg in all_aggregates})
+        return all_aggregates
+
+    def _get_cached_aggregate(self, name):
+        """Return an aggregate by name if its id is known, else None."""
+        if not CONF.nova.cache_ttl:
+            return None
+        cached = self._aggregate_ids_cache.get(CONF.nova.endpoint_override)
+        if cached is None or cached[0] <= time.monotonic():
+            return None
+        agg_id = cached[1].get(name)
+        if agg_id is None:
+            return None
+        try:
+            aggregate = self.nova.aggregates.get(agg_id)
+        except nova_exception.NotFound:
+            return None
+        # The aggregate may have been renamed since it was listed
+        return aggregate if aggregate.name == name else None
+
+    def get_aggregate_from_name_or_id(self, aggregate_obj):
+        """Return an aggregate by name or an id."""
+
+        aggregate = None
+        agg_id = self._get_aggregate_id(aggregate_obj)
 
         if agg_id is not None:
             try:
@@ -119,10 +182,11 @@ class ReservationPool(NovaClientWrapper):
             except nova_exception.NotFound:
                 aggregate = None
         else:
+            aggregate = self._get_cached_aggregate(aggregate_obj)
+        if aggregate is None and agg_id is None:
             # FIXME(scroiset): can't get an aggregate by name
             # so iter over all aggregate and check for the good one
-            all_aggregates = self.nova.aggregates.list()
-            for agg in all_aggregates:
+            for agg in self._list_aggregates():
                 if aggregate_obj == agg.name:
                     aggregate = agg
         if aggregate:
@@ -130,6 +194,34 @@ class ReservationPool(NovaClientWrapper):
         else:
             raise manager_exceptions.AggregateNotFound(pool=aggregate_obj)
 
+    def _get_aggregates(self, *aggregate_objs):
+        """Return aggregates by names or ids, None for the missing ones.
+
+        All the aggregates are listed with a single request instead of
+        looking each of them up separately.
+        """
+        all_aggregates = self._list_aggregates()
+        by_id = {agg.id: agg for agg in all_aggregates}
+        by_name = {agg.name: agg for agg in all_aggregates}
+
+        aggregates = []
+        for aggregate_obj in aggregate_objs:
+            agg_id = self._get_aggregate_id(aggregate_obj)
+            if agg_id is not None:
+                aggregates.append(by_id.get(agg_id))
+            else:
+                aggregates.append(by_name.get(aggregate_obj))
+        return aggregates
+
+    def _get_pool_and_freepool(self, pool):
+        """Return the aggregates of a pool and of the freepool."""
+        agg, freepool_agg = self._get_aggregates(pool, self.freepool_name)
+        if agg is None:
+            raise manager_exceptions.AggregateNotFound(pool=pool)
+        if freepool_agg is None:
+            raise manager_exceptions.NoFreePool()
+        return agg, freepool_agg
+
     @staticmethod
     def _generate_aggregate_name():
         return str(uuidgen.uuid4())
@@ -172,9 +264,8 @@ class ReservationPool(NovaClientWrapper):
 
         """
 
-        try:
-            agg = self.get_aggregate_from_name_or_id(pool)
-        except manager_exceptions.AggregateNotFound:
+        agg, freepool_agg = self._get_aggregates(pool, self.freepool_name)
+        if agg is None:
             LOG.warn("Aggregate '%s' not found, skipping deletion", pool)
             return
 
@@ -182,19 +273,39 @@ class ReservationPool(NovaClientWrapper):
         if len(hosts) > 0 and not force:
             raise manager_exceptions.AggregateHaveHost(name=agg.name,
                                                        hosts=agg.hosts)
-        try:
-            freepool_agg = self.get(self.freepool_name)
-        except manager_exceptions.AggregateNotFound:
+        if freepool_agg is None:
             raise manager_exceptions.NoFreePool()
-        for host in hosts:
+        freepool_hosts = set(freepool_agg.hosts)
+        client = self.nova
+
+        def _move_to_freepool(host):
             LOG.debug("Removing host '%(host)s' from aggregate '%(id)s')",
                       {'host': host, 'id': agg.id})
-            self.nova.aggregates.remove_host(agg.id, host)
+            client.aggregates.remove_host(agg.id, host)
+
+            if freepool_agg.id != agg.id and host not in freepool_hosts:
+                client.aggregates.add_host(freepool_agg.id, host)
+
+        self._run_per_host(_move_to_freepool, hosts)
+        client.aggregates.delete(agg.id)
 
-            if freepool_agg.id != agg.id and host not in freepool_agg.hosts:
-                self.nova.aggregates.add_host(freepool_agg.id, host)
+    def _run_per_host(self, action, hosts):
+        """Call action on every host, a bounded number at a time.
 
-        self.nova.aggregates.delete(agg.id)
+        Every host is attempted, then the failure of the first failing host
+        is raised. The action runs in green threads, which do not see the
+        request context, so it must not resolve self.nova itself.
+        """
+        def _action(host):
+            try:
+                action(host)
+            except Exception as e:
+                return e
+
+        green_pool = eventlet.GreenPool(CONF.nova.aggregate_host_concurrency)
+        errors = [e for e in green_pool.imap(_action, hosts) if e is not None]
+        if errors:
+            raise errors[0]
 
     def get_all(self):
         """Return all aggregate."""
@@ -224,115 +335,134 @@ class ReservationPool(NovaClientWrapper):
         :param hosts: Names (not UUID) of hosts to associate
         :type host: str or list of str
 
-        Return the related aggregate.
+        Return the related aggregate, with the added hosts in its hosts. It
+        is not fetched again from Nova after the hosts are added.
         Raise an aggregate exception if something wrong.
         """
 
         if not isinstance(hosts, list):
             hosts = [hosts]
+        # Drop repeated hosts, keeping the order of their first occurrence
+        hosts = list(dict.fromkeys(hosts))
 
         added_hosts = []
         removed_hosts = []
-        agg = self.get_aggregate_from_name_or_id(pool)
-
-        try:
-            freepool_agg = self.get(self.freepool_name)
-        except manager_exceptions.AggregateNotFound:
-            raise manager_exceptions.NoFreePool()
+        agg, freepool_agg = self._get_pool_and_freepool(pool)
+        leave_freepool = freepool_agg.id != agg.id and not stay_in
 
-        try:
+        if leave_freepool:
+            freepool_hosts = set(freepool_agg.hosts)
             for host in hosts:
-                if freepool_agg.id != agg.id and not stay_in:
-                    if host not in freepool_agg.hosts:
-                        raise manager_exceptions.HostNotInFreePool(
-                            host=host, freepool_name=freepool_agg.name)
-                    LOG.info("removing host '%(host)s' from freepool "
-                             "aggregate %(name)s",
-                             {'host': host, 'name': freepool_agg.name})
-                    try:
-                        self.remove_computehost(freepool_agg.id, host)
-                        removed_hosts.append(host)
-                    except nova_exception.NotFound:
-                        raise manager_exceptions.HostNotFound(host=host)
-
-                LOG.info("adding host '%(host)s' to aggregate %(id)s",
-                         {'host': host, 'id': agg.id})
+                if host not in freepool_hosts:
+                    raise manager_exceptions.HostNotInFreePool(
+                        host=host, freepool_name=freepool_agg.name)
+
+        client = self.nova
+
+        def _add_computehost(host):
+            if leave_freepool:
+                LOG.info("removing host '%(host)s' from freepool "
+                         "aggregate %(name)s",
+                         {'host': host, 'name': freepool_agg.name})
+                try:
+                    client.aggregates.remove_host(freepool_agg.id, host)
+                    removed_hosts.append(host)
+                except nova_exception.ClientException:
+                    raise manager_exceptions.CantRemoveHost(
+                        host=[host], pool=freepool_agg)
+
+            LOG.info("adding host '%(host)s' to aggregate %(id)s",
+                     {'host': host, 'id': agg.id})
+            try:
+                client.aggregates.add_host(agg.id, host)
+                added_hosts.append(host)
+            except nova_exception.NotFound:
+                raise manager_exceptions.HostNotFound(host=host)
+            except nova_exception.Conflict as e:
+                raise manager_exceptions.AggregateAlreadyHasHost(
+                    pool=pool, host=host, nova_exception=str(e))
+
+            # remove preemptible instances, only their id and name are needed
+            for server in client.servers.list(
+                    detailed=False,
+                    search_opts={"node": host, "all_tenants": 1}):
                 try:
-                    self.nova.aggregates.add_host(agg.id, host)
-                    added_hosts.append(host)
+                    LOG.info('Terminating preemptible instance %s (%s)',
+                             server.name, server.id)
+                    client.servers.delete(server=server)
                 except nova_exception.NotFound:
-                    raise manager_exceptions.HostNotFound(host=host)
-                except nova_exception.Conflict as e:
-                    raise manager_exceptions.AggregateAlreadyHasHost(
-                        pool=pool, host=host, nova_exception=str(e))
-
-                # remove preemptible instances
-                for server in self.nova.servers.list(
-                        search_opts={"node": host, "all_tenants": 1}):
-                    try:
-                        LOG.info('Terminating preemptible instance %s (%s)',
-                                 server.name, server.id)
-                        self.nova.servers.delete(server=server)
-                    except nova_exception.NotFound:
-                        LOG.info('Could not find server %s, may have been '
-                                 'deleted concurrently.', server)
-                    except Exception as e:
-                        LOG.exception(
-                            'Failed to delete %s: %s.', server, str(e))
+                    LOG.info('Could not find server %s, may have been '
+                             'deleted concurrently.', server)
+                except Exception as e:
+                    LOG.exception(
+                        'Failed to delete %s: %s.', server, str(e))
 
+        try:
+            self._run_per_host(_add_computehost, hosts)
         except Exception as e:
             if added_hosts:
                 LOG.warn('Removing hosts added to aggregate %s: %s',
                          agg.id, added_hosts)
-                for host in added_hosts:
-                    self.nova.aggregates.remove_host(agg.id, host)
+                self._run_per_host(
+                    lambda host: client.aggregates.remove_host(agg.id, host),
+                    added_hosts)
             if removed_hosts:
                 LOG.warn('Adding hosts back to freepool: %s', removed_hosts)
-                for host in removed_hosts:
-                    self.nova.aggregates.add_host(freepool_agg.id, host)
+                self._run_per_host(
+                    lambda host: client.aggregates.add_host(freepool_agg.id,
+                                                            host),
+                    removed_hosts)
             raise e
 
-        return self.get_aggregate_from_name_or_id(pool)
+        # All the hosts were added, keep them in the requested order
+        agg_hosts = set(agg.hosts)
+        agg.hosts = agg.hosts + [host for host in hosts
+                                 if host not in agg_hosts]
+        return agg
 
     def remove_all_computehosts(self, pool):
         """Remove all compute hosts attached to an aggregate."""
 
-        hosts = self.get_computehosts(pool)
-        self.remove_computehost(pool, hosts)
+        agg, freepool_agg = self._get_pool_and_freepool(pool)
+        self._remove_computehosts(agg, freepool_agg, agg.hosts)
 
     def remove_computehost(self, pool, hosts):
         """Remove compute host(s) from an aggregate."""
 
         if not isinstance(hosts, list):
             hosts = [hosts]
+        # Drop repeated hosts, keeping the order of their first occurrence
+        hosts = list(dict.fromkeys(hosts))
 
-        agg = self.get_aggregate_from_name_or_id(pool)
-
-        try:
-            freepool_agg = self.get(self.freepool_name)
-        except manager_exceptions.AggregateNotFound:
-            raise manager_exceptions.NoFreePool()
+        agg, freepool_agg = self._get_pool_and_freepool(pool)
+        self._remove_computehosts(agg, freepool_agg, hosts)
 
+    def _remove_computehosts(self, agg, freepool_agg, hosts):
         hosts_failing_to_remove = []
         hosts_failing_to_add = []
         hosts_not_in_freepool = []
-        for host in hosts:
-            if freepool_agg.id == agg.id:
-                if host not in freepool_agg.hosts:
-                    hosts_not_in_freepool.append(host)
-                    continue
+        freepool_hosts = set(freepool_agg.hosts)
+        if freepool_agg.id == agg.id:
+            hosts_not_in_freepool = [host for host in hosts
+                                     if host not in freepool_hosts]
+            hosts = [host for host in hosts if host in freepool_hosts]
+        client = self.nova
+
+        def _remove_computehost(host):
             try:
-                self.nova.aggregates.remove_host(agg.id, host)
+                client.aggregates.remove_host(agg.id, host)
             except nova_exception.ClientException:
                 hosts_failing_to_remove.append(host)
-            if freepool_agg.id != agg.id and host not in freepool_agg.hosts:
+            if freepool_agg.id != agg.id and host not in freepool_hosts:
                 # NOTE(sbauza) : We don't want to put again the host in
                 # freepool if the requested pool is the freepool...
                 try:
-                    self.nova.aggregates.add_host(freepool_agg.id, host)
+                    client.aggregates.add_host(freepool_agg.id, host)
                 except nova_exception.ClientException:
                     hosts_failing_to_add.append(host)
 
+        self._run_per_host(_remove_computehost, hosts)
+
         if hosts_failing_to_remove:
             raise manager_exceptions.CantRemoveHost(
                 host=hosts_failing_to_remove, pool=agg)
@@ -363,6 +493,27 @@ class ReservationPool(NovaClientWrapper):
 
 class NovaInventory(NovaClientWrapper):
 
+    # Availability zone of each nova-compute host, keyed on the Nova
+    # endpoint, with the time at which it expires.
+    _availability_zones_cache = {}
+
+    def _get_availability_zones_by_host(self):
+        """Return the availability zone name of each nova-compute host."""
+        ttl = CONF.nova.cache_ttl
+        key = CONF.nova.endpoint_override
+        now = time.monotonic()
+        cached = self._availability_zones_cache.get(key)
+        if not ttl or cached is None or cached[0] <= now:
+            zones = self.nova.availability_zones.list(detailed=True)
+            cached = (now + ttl, {
+                host_name: zone.zoneName
+                for zone in zones
+                for host_name, services in (zone.hosts or {}).items()
+                if 'nova-compute' in services})
+            if ttl:
+                self._availability_zones_cache[key] = cached
+        return cached[1]
+
     def get_host_details(self, host):
         """Get Nova capabilities of a single host
 
@@ -378,12 +529,25 @@ class NovaInventory(NovaClientWrapper):
             hypervisor = self.nova.hypervisors.get(host)
         except (nova_exception.NotFound, nova_exception.BadRequest):
             # Name (not id or uuid) is given for the `host` parameter.
+            detailed = True
             try:
-                hypervisors_list = self.nova.hypervisors.search(host)
+                try:
+                    # NOTE: From microversion 2.53 the search can return
+                    # the full hypervisor records, saving a get afterwards.
+                    # novaclient raises UnsupportedVersion below 2.53, and
+                    # releases older than its 2.53 support reject the
+                    # argument with a TypeError.
+                    hypervisors_list = self.nova.hypervisors.search(
+                        host, detailed=True)
+                except (nova_exception.UnsupportedVersion, TypeError):
+                    detailed = False
+                    hypervisors_list = self.nova.hypervisors.search(host)
             except nova_exception.NotFound:
                 raise manager_exceptions.HostNotFound(host=host)
             if len(hypervisors_list) > 1:
                 raise manager_exceptions.MultipleHostsFound(host=host)
+            elif detailed:
+                hypervisor = hypervisors_list[0]
             else:
                 hypervisor_id = hypervisors_list[0].id
                 # NOTE(sbauza): No need to catch the exception as we're sure
@@ -392,16 +556,15 @@ class NovaInventory(NovaClientWrapper):
 
         az_name = ''
         if CONF.nova.az_aware:
-            host_name = hypervisor.service['host']
-            for zone in self.nova.availability_zones.list(detailed=True):
-                if (zone.hosts and host_name in zone.hosts
-                   and 'nova-compute' in zone.hosts[host_name]):
-                    az_name = zone.zoneName
+            az_name = self._get_availability_zones_by_host().get(
+                hypervisor.service['host'], '')
 
         try:
             # NOTE(tetsuro): compute API microversion 2.28 changes cpu_info
             # from string to object
-            cpu_info = str(hypervisor.cpu_info)
+            cpu_info = hypervisor.cpu_info
+            if not isinstance(cpu_info, str):
+                cpu_info = jsonutils.dumps(cpu_info)
             return {'id': hypervisor.id,
                     'availability_zone': az_name,
                     'hypervisor_hostname': hypervisor.hypervisor_hostname,
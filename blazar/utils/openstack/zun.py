@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
 from oslo_config import cfg
 
 from blazar.manager import exceptions as manager_exceptions
@@ -33,7 +35,13 @@ zun_opts = [
         help='Zun API microversion'),
     cfg.StrOpt(
         'endpoint_override',
-        help='Zun endpoint URL to use')
+        help='Zun endpoint URL to use'),
+    cfg.IntOpt(
+        'cache_ttl',
+        default=10,
+        min=0,
+        help='Number of seconds the listing of the Zun hosts is reused to '
+             'look hosts up by name. Set to 0 to disable caching.')
 ]
 
 CONF = cfg.CONF
@@ -53,17 +61,49 @@ class BlazarZunClient(object):
             CONF.zun.zun_api_version, **client_kwargs)
 
     def __getattr__(self, attr):
-        return getattr(self.zun, attr)
+        # Keep the attribute on the wrapper so that later lookups of it do
+        # not go through __getattr__ again
+        value = getattr(self.zun, attr)
+        setattr(self, attr, value)
+        return value
 
 
 class ZunClientWrapper(object):
+    # ((endpoint override, global request id), client) of the last client
+    _zun_client = None
+
     @property
     def zun(self):
-        zun = BlazarZunClient(endpoint_override=CONF.zun.endpoint_override)
-        return zun
+        # The client is reused within a request, it is built again when the
+        # request, and so the global request id it passes on, changes
+        key = (CONF.zun.endpoint_override, base.current_global_request_id())
+        if self._zun_client is None or self._zun_client[0] != key:
+            self._zun_client = (
+                key, BlazarZunClient(endpoint_override=key[0]))
+        return self._zun_client[1]
 
 
 class ZunInventory(BlazarZunClient):
+
+    # Zun hosts by hostname, keyed on the Zun endpoint, with the time at
+    # which they expire.
+    _hosts_cache = {}
+
+    def _get_hosts_by_name(self):
+        """Return the Zun hosts matching each hostname."""
+        ttl = CONF.zun.cache_ttl
+        key = CONF.zun.endpoint_override
+        now = time.monotonic()
+        cached = self._hosts_cache.get(key)
+        if not ttl or cached is None or cached[0] <= now:
+            hosts_by_name = {}
+            for h in self.zun.hosts.list():
+                hosts_by_name.setdefault(h.hostname, []).append(h)
+            cached = (now + ttl, hosts_by_name)
+            if ttl:
+                self._hosts_cache[key] = cached
+        return cached[1]
+
     def get_host_details(self, host):
         """Get Zun capabilities of a single host
 
@@ -73,16 +113,14 @@ class ZunInventory(BlazarZunClient):
         try:
             host = self.zun.hosts.get(host)
         except (zun_exception.NotFound, zun_exception.BadRequest):
-            host_ids = []
-            for h in self.zun.hosts.list():
-                if h.hostname == host:
-                    host_ids.append(h.uuid)
-            if len(host_ids) == 0:
+            hosts = self._get_hosts_by_name().get(host, [])
+            if len(hosts) == 0:
                 raise manager_exceptions.HostNotFound(host=host)
-            elif len(host_ids) > 1:
+            elif len(hosts) > 1:
                 raise manager_exceptions.MultipleHostsFound(host=host)
             else:
-                host = self.zun.hosts.get(host_ids[0])
+                # The listed host already has the uuid and hostname needed
+                host = hosts[0]
 
         return {'id': host.uuid,
                 'name': host.hostname,